@@ -1,16 +1,26 @@
 # -*- coding: utf-8 -*-
+import asyncio
 import logging
 import os
 import subprocess
+import tempfile
+import time
 import traceback
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from discord.ext.commands import has_permissions
-from lib.api import IdolaAPI
+from lib.alerts import BORDER_ALERT, RANK_ALERT
+from lib.api import AmbiguousProfileName, IdolaAPI
 from lib.bumped import BumpedParser
+from lib.channels import ChannelRenamer
+from lib.estimate import estimate_borders
+from lib.export import EXPORT_FORMATS, GUILD_FIELDS, PLAYER_FIELDS, export_rows
+from lib.paginator import ReactionPaginator
+from lib.scheduler import EVENT_GRACE_PERIOD, Scheduler, event_interval
+from lib.shortener import LinkShortener
 from lib.twitter import TwitterAPI
-from lib.util import base_round
+from lib.util import sparkline
 from lib.web_visualiser import NNSTJPWebVisualiser
 
 logger = logging.getLogger(f"idola.{__name__}")
@@ -20,6 +30,7 @@ IDOLA_DEVICE_ID = os.getenv("IDOLA_DEVICE_ID")
 IDOLA_DEVICE_TOKEN = os.getenv("IDOLA_DEVICE_TOKEN")
 IDOLA_TOKEN_KEY = os.getenv("IDOLA_TOKEN_KEY")
 IDOLA_UUID = os.getenv("IDOLA_UUID")
+ARENA_TEAM_CACHE_TTL = int(os.getenv("ARENA_TEAM_CACHE_TTL") or 300)
 
 TWITTER_ACCESS_TOKEN_KEY = os.getenv("TWITTER_ACCESS_TOKEN_KEY")
 TWITTER_ACCESS_TOKEN_SECRET = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
@@ -32,6 +43,49 @@ idola = IdolaAPI(
     IDOLA_DEVICE_TOKEN,
     IDOLA_TOKEN_KEY,
     IDOLA_UUID,
+    arena_party_cache_ttl=ARENA_TEAM_CACHE_TTL,
+)
+
+BORDERS = {
+    ("arena", 50): idola.get_top_50_arena_border,
+    ("arena", 100): idola.get_top_100_arena_border,
+    ("arena", 500): idola.get_top_500_arena_border,
+    ("arena", 1000): idola.get_top_1000_arena_border,
+    ("suppression", 100): idola.get_top_100_raid_suppression_border,
+    ("suppression", 500): idola.get_top_500_raid_suppression_border,
+    ("suppression", 1000): idola.get_top_1000_raid_suppression_border,
+    ("suppression", 2000): idola.get_top_2000_raid_suppression_border,
+    ("suppression", 5000): idola.get_top_5000_raid_suppression_border,
+    ("creation", 100): idola.get_top_100_raid_creation_border,
+    ("creation", 500): idola.get_top_500_raid_creation_border,
+    ("creation", 1000): idola.get_top_1000_raid_creation_border,
+    ("creation", 2000): idola.get_top_2000_raid_creation_border,
+    ("creation", 5000): idola.get_top_5000_raid_creation_border,
+}
+RANKING_TYPES = ("arena", "suppression", "creation")
+LEADERBOARD_CRAWL_INTERVAL = 30 * 60
+LEADERBOARD_MAX_AGE = 2 * LEADERBOARD_CRAWL_INTERVAL
+STATS_BORDER_RANKS = (100, 500, 1000, 2000, 5000)
+STATS_RANK_BANDS = ((1, 100), (101, 500), (501, 1000), (1001, 2000), (2001, 5000))
+MAX_ALERTS_PER_USER = 10
+ALERT_BATCH_SIZE = 10
+LEADERBOARD_PAGE_SIZE = 20
+LEADERBOARD_VIEW_RANKS = 100
+# (field title, ranking_type, ranks fetched exactly, tiers shown) for the pinned border message
+PINNED_BORDERS = (
+    ("Idola Arena Border", "arena", (100, 500, 1000), (100, 200, 300, 500, 750, 1000)),
+    (
+        "Idola Raid Suppression Border",
+        "suppression",
+        (100, 500, 1000, 5000),
+        (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000),
+    ),
+    (
+        "Idola Creation Border",
+        "creation",
+        (100, 500, 1000, 5000),
+        (100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 4000, 5000),
+    ),
 )
 
 
@@ -65,10 +119,71 @@ class IDOLA(commands.Cog):
         self.creation_border_1000_channel = os.getenv("CREATION_BORDER_1000_CHANNEL")
         self.creation_border_5000_channel = os.getenv("CREATION_BORDER_5000_CHANNEL")
 
+        self.channel_renamer = ChannelRenamer()
+
         self.border_message_channel = os.getenv("BORDER_MESSAGE_CHANNEL")
+        self.border_message = None
+        self.border_embed = None
 
         self.twitter_channel = os.getenv("IDOLA_TWITTER_CHANNEL")
 
+        self.movers_digest_channel = os.getenv("MOVERS_DIGEST_CHANNEL")
+        self.movers_digest_interval = float(os.getenv("MOVERS_DIGEST_INTERVAL") or 6) * 60 * 60
+
+        self.event_end_dates = {}
+
+        self.scheduler = Scheduler()
+        self.scheduler.add_job("relog", self.relog, interval=4 * 60 * 60, delay=4 * 60 * 60)
+        self.scheduler.add_job("event_info", self.event_info, interval=15 * 60, depends_on=("relog",))
+        self.scheduler.add_job(
+            "border_status_update",
+            self.border_status_update,
+            interval=lambda: self.border_interval("raid"),
+            priority=1,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job(
+            "border_channel_update",
+            self.border_channel_update,
+            interval=lambda: self.border_interval("arena", "raid"),
+            priority=2,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job(
+            "border_pinned_update",
+            self.border_pinned_update,
+            interval=lambda: self.border_interval("arena", "raid"),
+            priority=3,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job(
+            "alert_check",
+            self.alert_check,
+            interval=lambda: self.border_interval("arena", "raid"),
+            priority=4,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job(
+            "leaderboard_crawl",
+            self.leaderboard_crawl,
+            interval=self.leaderboard_crawl_interval,
+            priority=6,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job(
+            "event_archive",
+            self.event_archive,
+            interval=60 * 60,
+            priority=7,
+            depends_on=("relog", "event_info"),
+        )
+        self.scheduler.add_job("get_tweets", self.get_tweets, interval=5 * 60, priority=4, jitter=60)
+        self.scheduler.add_job("periodic_save", self.periodic_save, interval=60 * 60, priority=5, jitter=5 * 60)
+
+        self.shortlink_host = os.getenv("SHORTLINK_HOST") or "0.0.0.0"
+        self.shortlink_port = int(os.getenv("SHORTLINK_PORT") or 8080)
+        self.link_shortener = LinkShortener(idola.store, base_url=os.getenv("SHORTLINK_BASE_URL"))
+
     async def send_embed_error(self, ctx, message):
         embed = discord.Embed(
             title="Error",
@@ -92,13 +207,16 @@ class IDOLA(commands.Cog):
         for guild in self.client.guilds:
             logger.info(f"{self.client.user} is connected to the following guild:\n" f"{guild.name}(id: {guild.id})")
 
-        # Start looping tasks
-        self.relog.start()
-        self.border_status_update.start()
-        self.border_channel_update.start()
-        self.border_pinned_update.start()
-        self.periodic_save.start()
-        self.get_tweets.start()
+        # Start background jobs
+        self.scheduler.start()
+
+        if self.link_shortener.base_url:
+            try:
+                await self.link_shortener.start_server(self.shortlink_host, self.shortlink_port)
+            except OSError as e:
+                logger.error(f"Could not serve short links on {self.shortlink_host}:{self.shortlink_port} - {e}")
+                # Without the redirect endpoint the short links would be dead, hand out tinyurl/full links instead
+                self.link_shortener.base_url = None
 
     @commands.Cog.listener()
     async def on_command_error(self, ctx, error):
@@ -126,7 +244,7 @@ class IDOLA(commands.Cog):
     @commands.is_owner()
     async def restart(self, ctx):
         try:
-            idola.start()
+            await self.scheduler.call(idola.start)
             await self.send_embed_info(ctx, "IdolaBot has been restarted")
         except Exception as e:
             logger.exception(e)
@@ -148,36 +266,205 @@ class IDOLA(commands.Cog):
     @commands.is_owner()
     async def save_profiles(self, ctx):
         try:
-            idola.save_profile_cache()
-            idola.save_discord_profile_ids()
+            await self.scheduler.call(idola.save_profile_cache)
+            await self.scheduler.call(idola.save_discord_profile_ids)
             await self.send_embed_info(ctx, "Profile cache saved")
         except Exception as e:
             logger.exception(e)
             await self.send_embed_error(ctx, f"Could not save profile cache - {e}")
 
-    @tasks.loop(hours=1)
+    @commands.command(hidden=True)
+    @commands.is_owner()
+    async def scheduler_stats(self, ctx):
+        lines = [
+            f"{job['name']}: {job['runs']} runs, {job['failures']} failed, "
+            f"{job['fetches']} fetches ({job['fetch_time']:.1f}s), "
+            f"last {job['last_time']:.1f}s, avg {job['average_time']:.1f}s, "
+            + (f"every {job['interval']:.0f}s" if job["interval"] is not None else "suspended")
+            + f", next in {job['next_run']:.0f}s"
+            for job in self.scheduler.stats()
+        ]
+        text = "\n".join(lines)
+        embed = discord.Embed(title="Scheduler", description=f"```{text}```", color=discord.Colour.blue())
+        await ctx.send(embed=embed)
+
+    async def get_border(self, ranking_type, rank):
+        """Border for a ranking, fetched at most once per scheduler tick"""
+        home_notice = await self.scheduler.shared("home_notice", idola.get_home_notice)
+        event_id = home_notice["ant" if ranking_type == "arena" else "raid"]["event_id"]
+        return await self.scheduler.shared((ranking_type, rank), BORDERS[ranking_type, rank], event_id)
+
+    async def event_info(self):
+        """Keeps the event end dates that drive the border polling cadence up to date"""
+        await self.scheduler.shared("home_notice", idola.get_home_notice)
+        self.event_end_dates = {
+            "arena": await self.scheduler.call(idola.get_arena_event_end_date),
+            "raid": await self.scheduler.call(idola.get_raid_event_end_date),
+        }
+
+    def border_interval(self, *event_types):
+        """Polls often near the end of an event and sparsely otherwise, None suspends polling between events"""
+        now = idola.get_current_time()
+        intervals = [
+            event_interval((self.event_end_dates[event_type] - now).total_seconds())
+            for event_type in event_types
+            if event_type in self.event_end_dates
+        ]
+        if not intervals:
+            return 5 * 60
+        intervals = [interval for interval in intervals if interval is not None]
+        return min(intervals) if intervals else None
+
+    async def leaderboard_crawl(self):
+        crawler = idola.leaderboard_crawler
+        if not await self.scheduler.call(crawler.is_crawling):
+            home_notice = await self.scheduler.shared("home_notice", idola.get_home_notice)
+            event_ids = {event_type: home_notice[event_type]["event_id"] for event_type in ("ant", "raid")}
+            await self.scheduler.call(crawler.start, event_ids)
+        finished = []
+        for page in range(crawler.pages_per_step):
+            # One page per submission, commands queued on the API worker run in between pages
+            crawling, snapshot = await self.scheduler.shared(("leaderboard_crawl", page), crawler.step_page)
+            if snapshot is not None:
+                finished.append(snapshot)
+            if not crawling:
+                break
+        for snapshot_id, ranking_type in finished:
+            await self.post_movers_digest(ranking_type, snapshot_id)
+            if ranking_type in RANKING_TYPES:
+                snapshot = await self.scheduler.call(idola.get_leaderboard_snapshot, ranking_type)
+                leaderboard = snapshot["leaderboard"]
+                fired = await self.scheduler.call(idola.alerts.check_ranks, ranking_type, leaderboard)
+                await self.send_alerts(
+                    (alert.discord_id, self.get_rank_alert_message(alert, current_rank, len(leaderboard)))
+                    for alert, current_rank in fired
+                )
+
+    async def event_archive(self):
+        """Archives the final leaderboards of events that have ended"""
+        await self.scheduler.shared("event_archive", idola.archive_finished_events, EVENT_GRACE_PERIOD)
+
+    async def alert_check(self):
+        """Checks border alerts against the borders people are waiting on, in one pass per border"""
+        messages = []
+        for ranking_type, rank in sorted(idola.alerts.border_keys()):
+            border = await self.get_border(ranking_type, rank)
+            for alert in idola.alerts.check_border(ranking_type, rank, border):
+                messages.append(
+                    (
+                        alert.discord_id,
+                        f"The {ranking_type} top {rank} border reached {border:,d} points "
+                        f"(alert at {alert.score:,d})",
+                    )
+                )
+        await self.send_alerts(messages)
+
+    @staticmethod
+    def get_rank_alert_message(alert, current_rank, leaderboard_size):
+        if current_rank is None:
+            return f"You are no longer in the {alert.ranking_type} top {leaderboard_size:,d}"
+        return f"You dropped to rank {current_rank:,d} in {alert.ranking_type} (alert below {alert.rank:,d})"
+
+    async def send_alerts(self, messages):
+        """DMs fired alerts, one message per user and a batch of users at a time"""
+        lines_by_user = {}
+        for discord_id, line in messages:
+            lines_by_user.setdefault(discord_id, []).append(line)
+        users = list(lines_by_user.items())
+        for i in range(0, len(users), ALERT_BATCH_SIZE):
+            batch = users[i : i + ALERT_BATCH_SIZE]
+            await asyncio.gather(*(self.send_alert_dm(discord_id, lines) for discord_id, lines in batch))
+        if users:
+            logger.info(f"Sent alerts to {len(users)} users")
+
+    async def send_alert_dm(self, discord_id, lines):
+        try:
+            user = self.client.get_user(discord_id) or await self.client.fetch_user(discord_id)
+            embed = discord.Embed(title="Idola Alert", description="\n".join(lines), color=discord.Colour.blue())
+            await user.send(embed=embed)
+        except Exception as e:
+            logger.error(f"Could not send alerts to {discord_id} - {e}")
+
+    def leaderboard_crawl_interval(self):
+        """Keeps going every tick until the crawl in progress is done, then waits for the next one"""
+        if idola.leaderboard_crawler.is_crawling():
+            return 0
+        interval = self.border_interval("arena", "raid")
+        return None if interval is None else max(interval, LEADERBOARD_CRAWL_INTERVAL)
+
+    async def post_movers_digest(self, ranking_type, snapshot_id):
+        """Posts the movers since the last digest once movers_digest_interval has passed"""
+        if not self.movers_digest_channel:
+            return
+        state_key = f"movers_digest_{ranking_type}"
+        last_digest = await self.scheduler.call(idola.store.get_state, state_key)
+        if last_digest is None:
+            await self.scheduler.call(idola.store.set_state, state_key, f"{snapshot_id},{time.time()}")
+            return
+        last_snapshot_id, last_posted = last_digest.split(",")
+        if time.time() - float(last_posted) < self.movers_digest_interval:
+            return
+        try:
+            movers = await self.scheduler.call(idola.get_leaderboard_diff, ranking_type, int(last_snapshot_id))
+            if movers is not None:
+                channel = self.client.get_channel(int(self.movers_digest_channel))
+                await channel.send(embed=self.get_movers_embed(ranking_type, *movers, count=5))
+        except Exception as e:
+            logger.exception(e)
+        await self.scheduler.call(idola.store.set_state, state_key, f"{snapshot_id},{time.time()}")
+
+    def get_movers_embed(self, ranking_type, old, new, diff, count=10):
+        def name(profile_id, profile_name):
+            return f"{profile_name}({profile_id})" if profile_name else str(profile_id)
+
+        climbers = [
+            f"{new_rank} (+{old_rank - new_rank}) {name(profile_id, profile_name)}"
+            for profile_id, profile_name, old_rank, new_rank, _ in diff.climbers(count)
+        ]
+        fallers = [
+            f"{new_rank} (-{new_rank - old_rank}) {name(profile_id, profile_name)}"
+            for profile_id, profile_name, old_rank, new_rank, _ in diff.fallers(count)
+        ]
+        entries = [f"{rank}: {name(profile_id, profile_name)}" for rank, _, profile_id, profile_name in diff.entries]
+        exits = [f"{rank}: {name(profile_id, profile_name)}" for rank, _, profile_id, profile_name in diff.exits]
+
+        embed = discord.Embed(title=f"{ranking_type.capitalize()} Movers", color=discord.Colour.blue())
+        for title, lines, total in (
+            ("Climbers", climbers, len(climbers)),
+            ("Fallers", fallers, len(fallers)),
+            ("New", entries[:count], len(entries)),
+            ("Dropped Out", exits[:count], len(exits)),
+        ):
+            if not lines:
+                continue
+            more = f"\n... and {total - len(lines)} more" if total > len(lines) else ""
+            embed.add_field(name=title, value="```" + "\n".join(lines) + more + "```", inline=False)
+        if not embed.fields:
+            embed.description = "No changes"
+        old_time = idola.datetime_jp_format(idola.epoch_to_datetime(old["finished_at"]))
+        new_time = idola.datetime_jp_format(idola.epoch_to_datetime(new["finished_at"]))
+        embed.set_footer(text=f"{old_time} to {new_time}")
+        return embed
+
     async def periodic_save(self):
         try:
-            idola.save_profile_cache()
-            idola.save_discord_profile_ids()
+            await self.scheduler.call(idola.save_profile_cache)
+            await self.scheduler.call(idola.save_discord_profile_ids)
         except Exception as e:
             logger.exception(e)
 
-    @tasks.loop(minutes=5)
     async def border_status_update(self):
         try:
-            border_score = idola.get_top_100_raid_suppression_border()
+            border_score = await self.get_border("suppression", 100)
             logger.info(f"{border_score:,d} - SuppressionBorderTop100")
             await self.client.change_presence(activity=discord.Game(f"{border_score:,d} - SuppressionBorderTop100"))
         except Exception as e:
             logger.exception(e)
 
-    @tasks.loop(hours=4)
     async def relog(self):
         logger.info("Relogging")
-        idola.start()
+        await self.scheduler.shared("relog", idola.start)
 
-    @tasks.loop(minutes=5)
     async def get_tweets(self):
         try:
             await self._get_tweets()
@@ -194,16 +481,17 @@ class IDOLA(commands.Cog):
             return
 
         logger.info("Getting tweets")
-        tweets = self.twitter_api.get_tweets()
+        tweets = await self.client.loop.run_in_executor(None, self.twitter_api.get_tweets)
         channel = self.client.get_channel(int(self.twitter_channel))
         if not tweets:
             logger.info("No new tweets")
             return
 
-        for tweet in tweets:
+        translations = await self.twitter_api.translate_many([tweet.full_text for tweet in tweets])
+        for tweet, translation in zip(tweets, translations):
             embed = discord.Embed(
                 title="\u200b",
-                description=self.twitter_api.translate(tweet.full_text),
+                description=translation,
                 color=discord.Colour.blue(),
             )
             embed.set_author(
@@ -228,7 +516,6 @@ class IDOLA(commands.Cog):
             )
             await channel.send(embed=embed)
 
-    @tasks.loop(minutes=5)
     async def border_pinned_update(self):
         try:
             if not self.border_message_channel:
@@ -236,173 +523,118 @@ class IDOLA(commands.Cog):
 
             channel = self.client.get_channel(int(self.border_message_channel))
             logger.info(f"Updating pinned message in {channel.name}")
-            pinned_messages = await channel.pins()
-            border_message = None
-            for pinned_message in pinned_messages:
-                if pinned_message.author.id == self.client.user.id:
-                    border_message = pinned_message
-                    logger.info(f"Updating existing pinned message with ID {border_message.id}")
-                    break
 
             embed = discord.Embed(title="Idola Borders", color=discord.Colour.blue())
-
-            # Arena
-            border_score_point_100 = idola.get_top_100_arena_border()
-            border_score_point_500 = idola.get_top_500_arena_border()
-            border_score_point_1000 = idola.get_top_1000_arena_border()
-
-            border_output = (
-                f"🥇100: {border_score_point_100:,d} points\n" if border_score_point_100 else "🥇100: Unknown\n"
-            )
-            border_output += (
-                f"🥇500: {border_score_point_500:,d} points\n" if border_score_point_500 else "🥇500: Unknown\n"
-            )
-            border_output += (
-                f"🥇1000: {border_score_point_1000:,d} points\n" if border_score_point_1000 else "🥇1000: Unknown\n"
-            )
-            embed.add_field(name="Idola Arena Border", value=border_output, inline=False)
-
-            # Suppression
-            border_score_point_100 = idola.get_top_100_raid_suppression_border()
-            border_score_point_500 = idola.get_top_500_raid_suppression_border()
-            border_score_point_1000 = idola.get_top_1000_raid_suppression_border()
-            border_score_point_5000 = idola.get_top_5000_raid_suppression_border()
-
-            border_output = (
-                f"🥇100: {border_score_point_100:,d} points\n" if border_score_point_100 else "🥇100: Unknown\n"
-            )
-            border_output += (
-                f"🥇500: {border_score_point_500:,d} points\n" if border_score_point_500 else "🥇500: Unknown\n"
-            )
-            border_output += (
-                f"🥇1000: {border_score_point_1000:,d} points\n" if border_score_point_1000 else "🥇1000: Unknown\n"
-            )
-            border_output += (
-                f"🥇5000: {border_score_point_5000:,d} points\n" if border_score_point_5000 else "🥇5000: Unknown\n"
-            )
-            embed.add_field(name="Idola Raid Suppression Border", value=border_output, inline=False)
-
-            # Creation
-            border_score_point_100 = idola.get_top_100_raid_creation_border()
-            border_score_point_500 = idola.get_top_500_raid_creation_border()
-            border_score_point_1000 = idola.get_top_1000_raid_creation_border()
-            border_score_point_5000 = idola.get_top_5000_raid_creation_border()
-
-            border_output = (
-                f"🥇100: {border_score_point_100:,d} points\n" if border_score_point_100 else "🥇100: Unknown\n"
-            )
-            border_output += (
-                f"🥇500: {border_score_point_500:,d} points\n" if border_score_point_500 else "🥇500: Unknown\n"
-            )
-            border_output += (
-                f"🥇1000: {border_score_point_1000:,d} points\n" if border_score_point_1000 else "🥇1000: Unknown\n"
-            )
-            border_output += (
-                f"🥇5000: {border_score_point_5000:,d} points\n" if border_score_point_5000 else "🥇5000: Unknown\n"
-            )
-            embed.add_field(name="Idola Creation Border", value=border_output, inline=False)
-
-            # Time
-            current_time = idola.get_current_time()
-            end_date = idola.get_raid_event_end_date()
-            time_left = idola.datetime_difference(current_time, end_date)
-
-            embed.add_field(name="Time Left", value=time_left, inline=False)
-            embed.add_field(
-                name="Current Time",
-                value=idola.datetime_jp_format(current_time),
-                inline=True,
-            )
+            channel_ranks = {
+                (ranking_type, rank) for channel_id, _, ranking_type, rank in self.get_border_channels() if channel_id
+            }
+            for title, ranking_type, sample_ranks, tiers in PINNED_BORDERS:
+                # Only the sampled ranks and those shown on channels are fetched, the other tiers are interpolated
+                exact_ranks = set(sample_ranks) | {rank for rank in tiers if (ranking_type, rank) in channel_ranks}
+                samples = {rank: await self.get_border(ranking_type, rank) for rank in sorted(exact_ranks)}
+                estimates = estimate_borders(samples, tiers)
+                border_output = ""
+                for rank in tiers:
+                    if samples.get(rank):
+                        border_output += f"🥇{rank}: {samples[rank]:,d} points\n"
+                    elif rank in estimates and rank not in samples:
+                        estimate, error = estimates[rank]
+                        border_output += f"🔹{rank}: ~{estimate:,d} points (±{error:,d})\n"
+                    else:
+                        border_output += f"🥇{rank}: Unknown\n"
+                embed.add_field(name=title, value=border_output, inline=False)
+
+            # Time, the countdown is rendered by Discord so the embed only changes when a border does
+            end_date = await self.scheduler.shared("raid_end_date", idola.get_raid_event_end_date)
+            embed.add_field(name="Time Left", value=f"<t:{idola.datetime_to_epoch(end_date)}:R>", inline=False)
             embed.add_field(name="Ending at", value=idola.datetime_jp_format(end_date), inline=True)
 
+            border_embed = embed.to_dict()
+            if border_embed == self.border_embed:
+                logger.info("Borders unchanged, skipping pinned message update")
+                return
+            embed.set_footer(text="Last changed")
+            embed.timestamp = idola.get_current_time()
+
+            border_message = await self.get_border_message(channel)
+            if border_message is not None:
+                try:
+                    await border_message.edit(embed=embed)
+                except discord.NotFound:
+                    border_message = None
             if border_message is None:
-                await border_message.edit(embed=embed)
-            else:
                 border_message = await channel.send(embed=embed)
                 await border_message.pin()
+                idola.store.set_state("border_message_id", str(border_message.id))
+            self.border_message = border_message
+            self.border_embed = border_embed
         except Exception as e:
             logger.exception(e)
 
-    @tasks.loop(minutes=5)
-    async def border_channel_update(self):
-        logger.info("Updating channel borders")
-        try:
+    async def get_border_message(self, channel):
+        """Returns the pinned border message, looking it up by its stored ID once per run"""
+        if self.border_message is not None:
+            return self.border_message
+
+        message_id = idola.store.get_state("border_message_id")
+        if message_id:
+            try:
+                return await channel.fetch_message(int(message_id))
+            except discord.NotFound:
+                logger.info(f"Pinned border message {message_id} no longer exists")
+                return None
+
+        # Messages pinned before the ID was stored
+        for pinned_message in await channel.pins():
+            if pinned_message.author.id == self.client.user.id:
+                logger.info(f"Found existing pinned message with ID {pinned_message.id}")
+                idola.store.set_state("border_message_id", str(pinned_message.id))
+                return pinned_message
+        return None
+
+    def get_border_channels(self):
+        """(channel_id, label, ranking_type, rank) of every border channel, channel_id is None when not configured"""
+        return [
             # Arena
-            if self.arena_border_50_channel:
-                arena_border_score_50 = idola.get_top_50_arena_border()
-                channel = self.client.get_channel(int(self.arena_border_50_channel))
-                await channel.edit(
-                    name=f"🏆50: {arena_border_score_50:,d}" if arena_border_score_50 else f"🏆50: Unknown"
-                )
-            if self.arena_border_100_channel:
-                arena_border_score_100 = idola.get_top_100_arena_border()
-                channel = self.client.get_channel(int(self.arena_border_100_channel))
-                await channel.edit(
-                    name=f"🥇100: {arena_border_score_100:,d}" if arena_border_score_100 else f"🥇100: Unknown"
-                )
-            if self.arena_border_500_channel:
-                arena_border_score_500 = idola.get_top_500_arena_border()
-                channel = self.client.get_channel(int(self.arena_border_500_channel))
-                await channel.edit(
-                    name=f"🥈500: {arena_border_score_500:,d}" if arena_border_score_500 else f"🥈500: Unknown"
-                )
-            if self.arena_border_1000_channel:
-                arena_border_score_1000 = idola.get_top_1000_arena_border()
-                channel = self.client.get_channel(int(self.arena_border_1000_channel))
-                await channel.edit(
-                    name=f"🥉1K: {arena_border_score_1000:,d}" if arena_border_score_1000 else f"🥉1K: Unknown"
-                )
+            (self.arena_border_50_channel, "🏆50", "arena", 50),
+            (self.arena_border_100_channel, "🥇100", "arena", 100),
+            (self.arena_border_500_channel, "🥈500", "arena", 500),
+            (self.arena_border_1000_channel, "🥉1K", "arena", 1000),
             # Suppression
-            if self.suppression_border_100_channel:
-                raid_suppression_border_100 = idola.get_top_100_raid_suppression_border()
-                channel = self.client.get_channel(int(self.suppression_border_100_channel))
-                await channel.edit(
-                    name=f"🥇100: {raid_suppression_border_100:,d}" if raid_suppression_border_100 else f"🥇100: Unknown"
-                )
-            if self.suppression_border_1000_channel:
-                raid_suppression_border_1000 = idola.get_top_1000_raid_suppression_border()
-                channel = self.client.get_channel(int(self.suppression_border_1000_channel))
-                await channel.edit(
-                    name=f"🥈1K: {raid_suppression_border_1000:,d}" if raid_suppression_border_1000 else f"🥈1K: Unknown"
-                )
-            if self.suppression_border_5000_channel:
-                raid_suppression_border_5000 = idola.get_top_5000_raid_suppression_border()
-                channel = self.client.get_channel(int(self.suppression_border_5000_channel))
-                await channel.edit(
-                    name=f"🥉5K: {raid_suppression_border_5000:,d}" if raid_suppression_border_5000 else f"🥉5K: Unknown"
-                )
+            (self.suppression_border_100_channel, "🥇100", "suppression", 100),
+            (self.suppression_border_1000_channel, "🥈1K", "suppression", 1000),
+            (self.suppression_border_5000_channel, "🥉5K", "suppression", 5000),
             # Creation
-            if self.creation_border_100_channel:
-                raid_creation_border_100 = idola.get_top_100_raid_creation_border()
-                channel = self.client.get_channel(int(self.creation_border_100_channel))
-                await channel.edit(
-                    name=f"🥇100: {raid_creation_border_100:,d}" if raid_creation_border_100 else f"🥇100: Unknown"
-                )
-            if self.creation_border_1000_channel:
-                raid_creation_border_1000 = idola.get_top_1000_raid_creation_border()
-                channel = self.client.get_channel(int(self.creation_border_1000_channel))
-                await channel.edit(
-                    name=f"🥈1K: {raid_creation_border_1000:,d}" if raid_creation_border_1000 else f"🥈1K: Unknown"
-                )
-            if self.creation_border_5000_channel:
-                raid_creation_border_5000 = idola.get_top_5000_raid_creation_border()
-                channel = self.client.get_channel(int(self.creation_border_5000_channel))
-                await channel.edit(
-                    name=f"🥉5K: {raid_creation_border_5000:,d}" if raid_creation_border_5000 else f"🥉5K: Unknown"
-                )
+            (self.creation_border_100_channel, "🥇100", "creation", 100),
+            (self.creation_border_1000_channel, "🥈1K", "creation", 1000),
+            (self.creation_border_5000_channel, "🥉5K", "creation", 5000),
+        ]
+
+    async def border_channel_update(self):
+        logger.info("Updating channel borders")
+        try:
+            channel_names = {}
+            for channel_id, label, ranking_type, rank in self.get_border_channels():
+                if not channel_id:
+                    continue
+                border_score = await self.get_border(ranking_type, rank)
+                channel = self.client.get_channel(int(channel_id))
+                channel_names[channel] = f"{label}: {border_score:,d}" if border_score else f"{label}: Unknown"
+            renamed = await self.channel_renamer.rename(channel_names)
+            logger.info(f"Renamed {renamed} of {len(channel_names)} border channels")
         except Exception as e:
             logger.exception(e)
 
     @commands.command()
     async def arena_border(self, ctx):
         """Shows the border for arena"""
-        border_score_point_50 = idola.get_top_50_arena_border()
-        border_score_point_100 = idola.get_top_100_arena_border()
-        border_score_point_500 = idola.get_top_500_arena_border()
-        border_score_point_1000 = idola.get_top_1000_arena_border()
+        border_score_point_50 = await self.scheduler.call(idola.get_top_50_arena_border)
+        border_score_point_100 = await self.scheduler.call(idola.get_top_100_arena_border)
+        border_score_point_500 = await self.scheduler.call(idola.get_top_500_arena_border)
+        border_score_point_1000 = await self.scheduler.call(idola.get_top_1000_arena_border)
 
         current_time = idola.get_current_time()
-        end_date = idola.get_raid_event_end_date()
+        end_date = await self.scheduler.call(idola.get_raid_event_end_date)
         time_left = idola.datetime_difference(current_time, end_date)
 
         embed = discord.Embed(
@@ -446,14 +678,14 @@ class IDOLA(commands.Cog):
     @commands.command()
     async def suppression_border(self, ctx):
         """Shows the border for Idola Raid Suppression"""
-        border_score_point_100 = idola.get_top_100_raid_suppression_border()
-        border_score_point_500 = idola.get_top_500_raid_suppression_border()
-        border_score_point_1000 = idola.get_top_1000_raid_suppression_border()
-        border_score_point_2000 = idola.get_top_2000_raid_suppression_border()
-        border_score_point_5000 = idola.get_top_5000_raid_suppression_border()
+        border_score_point_100 = await self.scheduler.call(idola.get_top_100_raid_suppression_border)
+        border_score_point_500 = await self.scheduler.call(idola.get_top_500_raid_suppression_border)
+        border_score_point_1000 = await self.scheduler.call(idola.get_top_1000_raid_suppression_border)
+        border_score_point_2000 = await self.scheduler.call(idola.get_top_2000_raid_suppression_border)
+        border_score_point_5000 = await self.scheduler.call(idola.get_top_5000_raid_suppression_border)
 
         current_time = idola.get_current_time()
-        end_date = idola.get_raid_event_end_date()
+        end_date = await self.scheduler.call(idola.get_raid_event_end_date)
         time_left = idola.datetime_difference(current_time, end_date)
 
         embed = discord.Embed(
@@ -502,14 +734,14 @@ class IDOLA(commands.Cog):
     @commands.command()
     async def creation_border(self, ctx):
         """Shows the border for Idola Raid Creation"""
-        border_score_point_100 = idola.get_top_100_raid_creation_border()
-        border_score_point_500 = idola.get_top_500_raid_creation_border()
-        border_score_point_1000 = idola.get_top_1000_raid_creation_border()
-        border_score_point_2000 = idola.get_top_2000_raid_creation_border()
-        border_score_point_5000 = idola.get_top_5000_raid_creation_border()
+        border_score_point_100 = await self.scheduler.call(idola.get_top_100_raid_creation_border)
+        border_score_point_500 = await self.scheduler.call(idola.get_top_500_raid_creation_border)
+        border_score_point_1000 = await self.scheduler.call(idola.get_top_1000_raid_creation_border)
+        border_score_point_2000 = await self.scheduler.call(idola.get_top_2000_raid_creation_border)
+        border_score_point_5000 = await self.scheduler.call(idola.get_top_5000_raid_creation_border)
 
         current_time = idola.get_current_time()
-        end_date = idola.get_raid_event_end_date()
+        end_date = await self.scheduler.call(idola.get_raid_event_end_date)
         time_left = idola.datetime_difference(current_time, end_date)
 
         embed = discord.Embed(title="Idola Raid Creation Border", color=discord.Colour.blue())
@@ -552,6 +784,349 @@ class IDOLA(commands.Cog):
         )
         await ctx.send(embed=embed)
 
+    @commands.command()
+    async def border_forecast(self, ctx, ranking_type):
+        """Projects the final borders from this event's border history e.g. !border_forecast arena"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        home_notice = await self.scheduler.call(idola.get_cached_home_notice)
+        event_id = home_notice["ant" if ranking_type == "arena" else "raid"]["event_id"]
+        if ranking_type == "arena":
+            end_date = await self.scheduler.call(idola.get_arena_event_end_date)
+        else:
+            end_date = await self.scheduler.call(idola.get_raid_event_end_date)
+        forecast = await self.scheduler.call(idola.get_border_forecast, ranking_type, event_id, end_date)
+        if not forecast:
+            await self.send_embed_error(ctx, f"Not enough {ranking_type} border history to forecast yet")
+            return
+
+        embed = discord.Embed(
+            title=f"{ranking_type.capitalize()} Border Forecast",
+            description=f"Ending at {idola.datetime_jp_format(end_date)}",
+            color=discord.Colour.blue(),
+        )
+        for rank, projection in forecast.items():
+            embed.add_field(
+                name=f"Top {rank}",
+                value=f"{projection['projected']:,d} points\n"
+                f"now {projection['latest']:,d} ({projection['per_hour']:+,.0f}/h)",
+                inline=True,
+            )
+        embed.set_footer(text="Weighted linear trend of the recorded borders, recent hours count the most")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def border_history(self, ctx, ranking_type, rank: int = 100):
+        """Shows how a border has moved this event e.g. !border_history suppression 1000"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        event_id, history = await self.scheduler.call(idola.get_border_history, ranking_type, rank)
+        if not history:
+            ranks = await self.scheduler.call(idola.store.get_border_ranks, ranking_type, event_id) if event_id else []
+            tracked = f", recorded ranks are {', '.join(map(str, ranks))}" if ranks else ""
+            await self.send_embed_error(ctx, f"No history for the {ranking_type} top {rank} border yet{tracked}")
+            return
+
+        timestamps, scores = zip(*history)
+        change = scores[-1] - scores[0]
+        hours = (timestamps[-1] - timestamps[0]) / 3600
+        sample_count = min(len(history), 8)
+        samples = sorted({i * (len(history) - 1) // max(sample_count - 1, 1) for i in range(sample_count)})
+        sample_lines = [
+            f"{idola.datetime_jp_format(idola.epoch_to_datetime(timestamps[i]))[5:16]} {scores[i]:>13,d}"
+            for i in samples
+        ]
+        embed = discord.Embed(
+            title=f"{ranking_type.capitalize()} Top {rank} Border History",
+            description=f"```{sparkline(scores)}```",
+            color=discord.Colour.blue(),
+        )
+        embed.add_field(name="Latest", value=f"{scores[-1]:,d} points", inline=True)
+        embed.add_field(name="Change", value=f"{change:+,d} points", inline=True)
+        embed.add_field(name="Per Hour", value=f"{change / hours:+,.0f} points" if hours else "Unknown", inline=True)
+        embed.add_field(name="Samples (JST)", value="```" + "\n".join(sample_lines) + "```", inline=False)
+        embed.set_footer(text=f"Event {event_id} - {len(history)} samples")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def ranking_stats(self, ctx, ranking_type, score: int = None):
+        """Shows the score distribution of a ranking e.g. !ranking_stats suppression 900000"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        snapshot = await self.scheduler.call(idola.get_leaderboard_snapshot, ranking_type)
+        stale = snapshot is None or time.time() - snapshot["finished_at"] > LEADERBOARD_MAX_AGE
+        if stale:
+            self.scheduler.trigger("leaderboard_crawl")
+        if snapshot is None:
+            await self.send_embed_error(ctx, "This ranking hasn't been crawled yet, try again in a few minutes")
+            return
+
+        leaderboard = snapshot["leaderboard"]
+        # Ranks past the end of the board have no border, leave them out so they don't show up as gaps
+        border_ranks = [rank for rank in STATS_BORDER_RANKS if rank <= len(leaderboard)]
+        borders = leaderboard.borders(border_ranks)
+        gaps = list(leaderboard.border_gaps(border_ranks)) + [None]
+        border_lines = [
+            f"Top {rank}: {border:,d}" + (f" (+{gap:,d})" if gap else "")
+            for rank, border, gap in zip(border_ranks, borders.tolist(), gaps)
+        ]
+        band_lines = [
+            f"{band['start']}-{band['end']}: {band['min']:,d} - {band['max']:,d}, median {band['median']:,d}"
+            for band in leaderboard.band_stats(STATS_RANK_BANDS)
+            if band["players"]
+        ]
+        counts, edges = leaderboard.histogram(bins=20)
+        median, p90, p99 = leaderboard.quantiles([0.5, 0.9, 0.99]).tolist()
+
+        embed = discord.Embed(
+            title=f"{ranking_type.capitalize()} Ranking Stats",
+            description=f"```{edges[0]:,.0f} {sparkline(counts.tolist())} {edges[-1]:,.0f}```",
+            color=discord.Colour.blue(),
+        )
+        embed.add_field(name="Borders", value="```" + "\n".join(border_lines) + "```", inline=False)
+        embed.add_field(name="Rank Bands", value="```" + "\n".join(band_lines) + "```", inline=False)
+        embed.add_field(
+            name="Quantiles",
+            value=f"Median {median:,.0f}\n90th {p90:,.0f}\n99th {p99:,.0f}",
+            inline=True,
+        )
+        if score is not None:
+            rank = leaderboard.rank_for_score(score)
+            if rank > len(leaderboard):
+                placement = f"Outside the top {len(leaderboard):,d}"
+            else:
+                percentile = leaderboard.percentile(score)
+                placement = f"Rank {rank:,d}\nAt or above {percentile:.1f}% of the top {len(leaderboard):,d}"
+            embed.add_field(name=f"{score:,d} points", value=placement, inline=True)
+        age = (time.time() - snapshot["finished_at"]) / 60
+        embed.set_footer(
+            text=f"Event {snapshot['event_id']} - {len(leaderboard):,d} players - crawled {age:.0f} minutes ago"
+            + (", refreshing" if stale else "")
+        )
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def movers(self, ctx, ranking_type, count: int = 10):
+        """Shows who climbed or dropped between the last two leaderboard crawls e.g. !movers suppression"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in idola.leaderboard_crawler.rankings:
+            ranking_types = ", ".join(idola.leaderboard_crawler.rankings)
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {ranking_types}")
+            return
+        movers = await self.scheduler.call(idola.get_leaderboard_diff, ranking_type)
+        if movers is None:
+            await self.send_embed_error(ctx, "Not enough leaderboard snapshots of this event to compare yet")
+            return
+        await ctx.send(embed=self.get_movers_embed(ranking_type, *movers, count=max(1, min(count, 20))))
+
+    @commands.command()
+    async def export(self, ctx, ranking_type, start: int = 1, end: int = None, file_format="csv"):
+        """Uploads a crawled leaderboard as a csv or jsonl file e.g. !export suppression 1 5000 jsonl"""
+        ranking_type = ranking_type.lower()
+        file_format = file_format.lower()
+        if ranking_type not in idola.leaderboard_crawler.rankings:
+            ranking_types = ", ".join(idola.leaderboard_crawler.rankings)
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {ranking_types}")
+            return
+        if file_format not in EXPORT_FORMATS:
+            await self.send_embed_error(ctx, f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+            return
+        snapshot = await self.scheduler.call(idola.get_leaderboard_snapshot, ranking_type)
+        if snapshot is None or time.time() - snapshot["finished_at"] > LEADERBOARD_MAX_AGE:
+            self.scheduler.trigger("leaderboard_crawl")
+        if snapshot is None:
+            await self.send_embed_error(ctx, "This ranking hasn't been crawled yet, try again in a few minutes")
+            return
+
+        leaderboard = snapshot["leaderboard"]
+        end = len(leaderboard) if end is None else end
+        rows = leaderboard.slice_ranks(start, end)
+        if not len(rows):
+            await self.send_embed_error(ctx, f"Nothing ranked from {start} to {end} in the top {len(leaderboard):,d}")
+            return
+        fields = PLAYER_FIELDS if idola.leaderboard_crawler.rankings[ranking_type].players else GUILD_FIELDS
+        filename = f"{ranking_type}_{snapshot['event_id']}_{start}-{end}.{file_format}"
+        with tempfile.TemporaryFile() as f:
+            count = await self.scheduler.call(export_rows, rows, file_format, f, fields)
+            f.seek(0)
+            await ctx.send(
+                f"{ranking_type.capitalize()} ranks {start:,d} to {end:,d} ({count:,d} rows)",
+                file=discord.File(f, filename=filename),
+            )
+
+    @commands.command()
+    async def my_rank(self, ctx):
+        """Shows your arena and raid ranks from the latest leaderboard crawls"""
+        profile_id = idola.get_profile_id_from_discord_id(int(ctx.message.author.id))
+        if profile_id is None:
+            await self.send_embed_error(
+                ctx, "Your profile has not been registered. Use `register_profile` to register your profile id."
+            )
+            return
+
+        embed = discord.Embed(title=f"{ctx.message.author.display_name}'s Ranks", color=discord.Colour.blue())
+        for ranking_type in RANKING_TYPES:
+            snapshots = await self.scheduler.call(idola.store.get_leaderboard_snapshots, ranking_type)
+            if not snapshots:
+                continue
+            snapshot_id, event_id, _ = snapshots[0]
+            history = await self.scheduler.call(idola.store.get_user_ranks, profile_id, ranking_type, event_id)
+            if not history or history[-1][1] != snapshot_id:
+                size = idola.leaderboard_crawler.rankings[ranking_type].size
+                embed.add_field(name=ranking_type.capitalize(), value=f"Outside the top {size:,d}", inline=False)
+                continue
+            ranks = [rank for _, _, rank, _ in history]
+            value = f"Rank {ranks[-1]:,d} - {history[-1][3]:,d} points"
+            if len(ranks) > 1:
+                value += f" ({ranks[-2] - ranks[-1]:+,d})"
+            if len(ranks) > 2:
+                # Flip the ranks so climbing shows as going up
+                value += f"\n`{sparkline([-rank for rank in ranks])}`"
+            embed.add_field(name=ranking_type.capitalize(), value=value, inline=False)
+        if not embed.fields:
+            embed.description = "No leaderboards have been crawled yet"
+        embed.set_footer(text=f"Profile {profile_id}")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def event_top(self, ctx, ranking_type, event_id: int = None, count: int = 20):
+        """Shows the final top players of a past event e.g. !event_top suppression 120 50"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        event_ids = idola.leaderboard_archive.events(ranking_type)
+        if not event_ids:
+            await self.send_embed_error(ctx, f"No {ranking_type} events have been archived yet")
+            return
+        if event_id is None:
+            event_id = event_ids[0]
+        top = idola.get_archived_event_top(ranking_type, event_id, max(1, min(count, 100)))
+        if top is None:
+            recent = ", ".join(str(archived_id) for archived_id in event_ids[:10])
+            await self.send_embed_error(ctx, f"Event {event_id} isn't archived, recent {ranking_type} events: {recent}")
+            return
+
+        msg = top.format_lines()
+        for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
+            text = "\n".join(chunks)
+            embed = discord.Embed(
+                title=f"{ranking_type.capitalize()} Event {event_id} Final Top {len(top)}" if j == 0 else "\u200b",
+                description=f"```{text}```",
+                color=discord.Colour.blue(),
+            )
+            await ctx.send(embed=embed)
+
+    @commands.command()
+    async def rank_history(self, ctx, ranking_type, events: int = 10):
+        """Shows your final ranks over the last archived events e.g. !rank_history suppression 10"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        profile_id = idola.get_profile_id_from_discord_id(int(ctx.message.author.id))
+        if profile_id is None:
+            await self.send_embed_error(
+                ctx, "Your profile has not been registered. Use `register_profile` to register your profile id."
+            )
+            return
+        history = idola.get_archived_rank_history(ranking_type, profile_id, max(1, min(events, 25)))
+        if not history:
+            await self.send_embed_error(ctx, f"No {ranking_type} events have been archived yet")
+            return
+
+        size = idola.leaderboard_crawler.rankings[ranking_type].size
+        lines = [
+            f"Event {event_id}: "
+            + (f"Rank {entry[0]:,d} - {entry[1]:,d} points" if entry else f"Outside the top {size:,d}")
+            for event_id, entry in history
+        ]
+        ranks = [entry[0] for _, entry in reversed(history) if entry]
+        embed = discord.Embed(
+            title=f"{ctx.message.author.display_name}'s {ranking_type.capitalize()} History",
+            description="```" + "\n".join(lines) + "```",
+            color=discord.Colour.blue(),
+        )
+        if len(ranks) > 2:
+            # Flip the ranks so climbing shows as going up, oldest event first
+            embed.add_field(name="Trend", value=f"`{sparkline([-rank for rank in ranks])}`", inline=False)
+        embed.set_footer(text=f"Profile {profile_id}")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def alert_border(self, ctx, ranking_type, rank: int, score: int):
+        """DMs you when a border reaches a score e.g. !alert_border suppression 1000 900000"""
+        ranking_type = ranking_type.lower()
+        if (ranking_type, rank) not in BORDERS:
+            borders = ", ".join(f"{border_type} {border_rank}" for border_type, border_rank in BORDERS)
+            await self.send_embed_error(ctx, f"Alerts are available for these borders: {borders}")
+            return
+        if not await self.can_add_alert(ctx):
+            return
+        alert = idola.alerts.add(ctx.message.author.id, BORDER_ALERT, ranking_type, rank, score=score)
+        await self.send_embed_info(
+            ctx, f"Alert {alert.alert_id}: DM when the {ranking_type} top {rank} border reaches {score:,d} points"
+        )
+
+    @commands.command()
+    async def alert_rank(self, ctx, ranking_type, rank: int):
+        """DMs you when your registered profile drops below a rank e.g. !alert_rank arena 100"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        size = idola.leaderboard_crawler.rankings[ranking_type].size
+        if not 1 <= rank <= size:
+            await self.send_embed_error(ctx, f"Rank must be between 1 and {size:,d}")
+            return
+        profile_id = idola.get_profile_id_from_discord_id(int(ctx.message.author.id))
+        if profile_id is None:
+            await self.send_embed_error(
+                ctx, "Your profile has not been registered. Use `register_profile` to register your profile id."
+            )
+            return
+        if not await self.can_add_alert(ctx):
+            return
+        alert = idola.alerts.add(ctx.message.author.id, RANK_ALERT, ranking_type, rank, profile_id=profile_id)
+        await self.send_embed_info(ctx, f"Alert {alert.alert_id}: DM when you drop below {ranking_type} rank {rank:,d}")
+
+    async def can_add_alert(self, ctx):
+        if len(idola.alerts.for_user(ctx.message.author.id)) >= MAX_ALERTS_PER_USER:
+            await self.send_embed_error(ctx, f"You can have up to {MAX_ALERTS_PER_USER} alerts, remove one first")
+            return False
+        return True
+
+    @commands.command()
+    async def alerts(self, ctx):
+        """Lists your border and rank alerts"""
+        lines = []
+        for alert in idola.alerts.for_user(ctx.message.author.id):
+            if alert.kind == BORDER_ALERT:
+                lines.append(f"{alert.alert_id}: {alert.ranking_type} top {alert.rank} border reaches {alert.score:,d}")
+            else:
+                lines.append(f"{alert.alert_id}: you drop below {alert.ranking_type} rank {alert.rank:,d}")
+        if not lines:
+            await self.send_embed_info(ctx, "You have no alerts")
+            return
+        text = "\n".join(lines)
+        embed = discord.Embed(title="Your Alerts", description=f"```{text}```", color=discord.Colour.blue())
+        embed.set_footer(text="Remove one with !alert_remove <id>")
+        await ctx.send(embed=embed)
+
+    @commands.command()
+    async def alert_remove(self, ctx, alert_id: int):
+        """Removes one of your alerts"""
+        if idola.alerts.remove(alert_id, ctx.message.author.id):
+            await self.send_embed_info(ctx, f"Removed alert {alert_id}")
+        else:
+            await self.send_embed_error(ctx, f"You don't have an alert {alert_id}")
+
     @commands.command()
     async def register_profile(self, ctx, profile_id: int):
         """Register an idola profile_id to your discord profile"""
@@ -563,7 +1138,7 @@ class IDOLA(commands.Cog):
 
     @commands.command()
     async def arena_team(self, ctx, arena_id=None):
-        """Shows the latest ranked arena team for a given profile_id/profile_name"""
+        """Shows the latest ranked arena team for a given profile_id/profile_name (or the start of a name)"""
         if arena_id is None:
             discord_id = ctx.message.author.id
             arena_id = idola.get_profile_id_from_discord_id(int(discord_id))
@@ -575,29 +1150,42 @@ class IDOLA(commands.Cog):
                 return
 
         arena_team = None
-        try:
-            arena_team = idola.get_arena_team_composition_from_name(str(arena_id))
-        except KeyError:
-            pass
-
-        if not arena_team:
+        arena_id = str(arena_id)
+        if arena_id.isdigit():
+            # Numeric input is most likely a profile_id, a name made of digits has to match exactly instead of by prefix
             try:
-                arena_team = idola.get_arena_team_composition(int(arena_id))
-            except (KeyError, ValueError):
+                arena_team = await self.scheduler.call(idola.get_arena_team_composition, int(arena_id))
+            except KeyError:
+                profile_id = await self.scheduler.call(idola.profiles.get, arena_id)
+                if profile_id is not None:
+                    try:
+                        arena_team = await self.scheduler.call(idola.get_arena_team_composition, int(profile_id))
+                    except KeyError:
+                        pass
+        else:
+            try:
+                arena_team = await self.scheduler.call(idola.get_arena_team_composition_from_name, arena_id)
+            except KeyError:
                 pass
+            except AmbiguousProfileName as e:
+                matches = "\n".join(f"{name}({profile_id})" for name, profile_id in e.matches)
+                await self.send_embed_error(
+                    ctx,
+                    f"'{e.name}' matches more than one player, try a longer name or a profile id:\n```{matches}```",
+                )
+                return
 
         if not arena_team:
             await self.send_embed_error(
                 ctx,
                 "Could not find a player by that name.\n"
                 "To update the cache run '!arena_team' with your profile id first.\n"
-                'To find a name that contains spaces use quotes around your profile name. (Eg. !arena_team "<profile_name>")\n'
-                "Note: Profile names are CASE-SENSITIVE",
+                'To find a name that contains spaces use quotes around your profile name. (Eg. !arena_team "<profile_name>")',
             )
             return
 
         try:
-            nnstjp_link = NNSTJPWebVisualiser.generate_shareable_link(arena_team["party_info"])
+            nnstjp_link = await self.link_shortener.shorten(NNSTJPWebVisualiser.generate_link(arena_team["party_info"]))
             nnstjp_formatted_link = f"NNSTJP: [{nnstjp_link}]({nnstjp_link})"
         except Exception as e:
             logger.exception(e)
@@ -647,63 +1235,55 @@ class IDOLA(commands.Cog):
         )
         await ctx.send(embed=embed)
 
+    async def send_leaderboard_view(self, ctx, ranking_type, title, start, end):
+        """Pages through live ranks start to end, each page is fetched the first time it's shown"""
+        pages = (end - start) // LEADERBOARD_PAGE_SIZE + 1
+
+        async def render(page):
+            first = start + page * LEADERBOARD_PAGE_SIZE
+            last = min(first + LEADERBOARD_PAGE_SIZE - 1, end)
+            leaderboard = await self.scheduler.call(idola.get_ranking_range, ranking_type, first, last)
+            text = "\n".join(leaderboard.format_lines()) or "No one is ranked here yet"
+            embed = discord.Embed(title=title, description=f"```{text}```", color=discord.Colour.blue())
+            embed.set_footer(text=f"Ranks {first:,d}-{last:,d} - page {page + 1}/{pages}")
+            return embed
+
+        await ReactionPaginator(self.client, render, pages).start(ctx)
+
+    @commands.command()
+    async def leaderboard(self, ctx, ranking_type, start: int = 1, end: int = None):
+        """Pages through any range of a live ranking e.g. !leaderboard suppression 1000 1100"""
+        ranking_type = ranking_type.lower()
+        if ranking_type not in RANKING_TYPES:
+            await self.send_embed_error(ctx, f"Ranking type must be one of: {', '.join(RANKING_TYPES)}")
+            return
+        size = idola.leaderboard_crawler.rankings[ranking_type].size
+        end = min(start + LEADERBOARD_VIEW_RANKS - 1, size) if end is None else end
+        if not 1 <= start <= end <= size:
+            await self.send_embed_error(ctx, f"Ranks must be between 1 and {size:,d} with start before end")
+            return
+        title = f"Idola {ranking_type.capitalize()} Ranks {start:,d}-{end:,d}"
+        await self.send_leaderboard_view(ctx, ranking_type, title, start, end)
+
     @commands.command()
     async def arena_top_100(self, ctx):
         """Shows the Top 100 Arena players"""
-        players = idola.show_arena_ranking_top_100_players()
-        msg = []
-        for profile_id, ranking_information in sorted(
-            players.items(),
-            key=lambda item: item[1]["arena_score_point"],
-        ):
-            arena_score_rank = ranking_information["arena_score_rank"]
-            arena_score_point = ranking_information["arena_score_point"]
-            name = ranking_information["name"]
-            msg.insert(
-                0,
-                f"{arena_score_rank}: {arena_score_point:,d} - {name}({profile_id})",
-            )
-        for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
-            text = "\n".join(chunks)
-            embed = discord.Embed(
-                title="Idola Arena Top 100" if j == 0 else "\u200b",
-                description=f"```{text}```",
-                color=discord.Colour.blue(),
-            )
-            await ctx.send(embed=embed)
+        await self.send_leaderboard_view(ctx, "arena", "Idola Arena Top 100", 1, 100)
 
     @commands.command()
     async def suppression_top_100(self, ctx):
         """Shows the Top 100 Idola Raid Suppression players"""
-        msg = idola.show_raid_suppression_top_100_players()
-        msg = msg.split("\n")
-        for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
-            text = "\n".join(chunks)
-            embed = discord.Embed(
-                title="Idola Raid Suppression Top 100" if j == 0 else "\u200b",
-                description=f"```{text}```",
-                color=discord.Colour.blue(),
-            )
-            await ctx.send(embed=embed)
+        await self.send_leaderboard_view(ctx, "suppression", "Idola Raid Suppression Top 100", 1, 100)
 
     @commands.command()
     async def creation_top_100(self, ctx):
         """Shows the Top 100 Idola Creation players"""
-        msg = idola.show_raid_creation_top_100_players()
-        msg = msg.split("\n")
-        for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
-            text = "\n".join(chunks)
-            embed = discord.Embed(
-                title="Idola Raid Creation Top 100" if j == 0 else "\u200b",
-                description=f"```{text}```",
-                color=discord.Colour.blue(),
-            )
-            await ctx.send(embed=embed)
+        await self.send_leaderboard_view(ctx, "creation", "Idola Raid Creation Top 100", 1, 100)
 
     @commands.command(aliases=["brigade_top_100"])
     async def guild_top_100(self, ctx):
         """Show the Top 100 brigade"""
-        msg = idola.show_top_100_guilds()
+        msg = await self.scheduler.call(idola.show_top_100_guilds)
         msg = msg.split("\n")
         for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
             text = "\n".join(chunks)
@@ -717,9 +1297,10 @@ class IDOLA(commands.Cog):
     @commands.command(aliases=["brigade_by_range"])
     async def guild_by_range(self, ctx, start: int, end: int):
         """Show top brigades in the leaderboards by range"""
-        round_start = base_round(int(start), base=20)
-        rounded_end = base_round(int(end), base=20)
-        msg = idola.show_top_guilds_by_range(round_start, rounded_end)
+        if not 1 <= start <= end:
+            await self.send_embed_error(ctx, "Ranks must start from 1 with start before end")
+            return
+        msg = await self.scheduler.call(idola.show_top_guilds_by_range, start, end)
         msg = msg.split("\n")
         for j, chunks in enumerate([msg[i : i + 50] for i in range(0, len(msg), 50)]):
             text = "\n".join(chunks)
@@ -733,10 +1314,10 @@ class IDOLA(commands.Cog):
     @commands.command(aliases=["guild_info", "brigade", "brigade_info"])
     async def guild(self, ctx, guild_id: int):
         """Shows brigade information"""
-        guild_info = idola.get_guild_info(guild_id)
-        guild_memberlist = idola.get_guild_memberlist(guild_id)
+        guild_info = await self.scheduler.call(idola.get_guild_info, guild_id)
+        guild_memberlist = await self.scheduler.call(idola.get_guild_memberlist, guild_id)
 
-        arena_top_500 = idola.show_arena_ranking_top_500_players()
+        arena_top_500 = await self.scheduler.call(idola.show_arena_ranking_top_500_players)
 
         guild_memberlist_msg = "```"
         for guild_member in guild_memberlist:
@@ -744,15 +1325,11 @@ class IDOLA(commands.Cog):
             user_rank = guild_member["user_rank"]
             user_id = guild_member["user_id"]
 
-            arena_rank_text = ""
-            arena_rank = 0
-            if user_id in arena_top_500:
-                arena_rank = arena_top_500.get(user_id, {}).get("arena_score_rank", "")
-                arena_rank_text = f"A:{arena_rank}"
+            arena_rank = arena_top_500.rank_of(user_id)
 
             guild_memberlist_msg += f"{user_rank:0>3}: {user_name}({user_id}) "
             if arena_rank:
-                guild_memberlist_msg += arena_rank_text
+                guild_memberlist_msg += f"A:{arena_rank}"
             guild_memberlist_msg += "\n"
         guild_memberlist_msg += "```"
 
@@ -775,7 +1352,7 @@ class IDOLA(commands.Cog):
     @commands.command(aliases=["find_brigade_by_name"])
     async def find_guild_by_name(self, ctx, guild_name):
         """Search for open brigades by their brigade name"""
-        guild_search_result = idola.get_guild_from_guild_name(guild_name)
+        guild_search_result = await self.scheduler.call(idola.get_guild_from_guild_name, guild_name)
         if not guild_search_result:
             await self.send_embed_error(ctx, "Could not find brigade by that name, they may be full")
             return
@@ -799,7 +1376,7 @@ class IDOLA(commands.Cog):
     @commands.command(aliases=["find_brigade_by_id"])
     async def find_guild_by_id(self, ctx, display_id):
         """Search for open brigades by their Display ID"""
-        guild_search_result = idola.get_guild_id_from_display_id(display_id)
+        guild_search_result = await self.scheduler.call(idola.get_guild_id_from_display_id, display_id)
         if not guild_search_result:
             await self.send_embed_error(ctx, "Could not find brigade by that name, they may be full")
             return
@@ -832,7 +1409,7 @@ class IDOLA(commands.Cog):
                     "Your arena_team has not been registered. Use `register_profile` to register your team. Or enter a profile id.",
                 )
                 return
-        player_name, char_option = idola.get_arena_next_options(int(profile_id))
+        player_name, char_option = await self.scheduler.call(idola.get_arena_next_options, int(profile_id))
         embed = discord.Embed(title=player_name, description="\u200b", color=discord.Colour.blue())
         embed.set_author(name="Arena Roll")
         for char in char_option:
@@ -908,13 +1485,14 @@ class IDOLA(commands.Cog):
             await self.send_embed_error(ctx, "Twitter channel not defined")
             return
 
-        tweet = self.twitter_api.get_test_tweet()
+        tweet = await self.client.loop.run_in_executor(None, self.twitter_api.get_test_tweet)
         if not tweet:
             await self.send_embed_info(ctx, "No test tweet to get")
             return
+        (translation,) = await self.twitter_api.translate_many([tweet.full_text])
         embed = discord.Embed(
             title="\u200b",
-            description=self.twitter_api.translate(tweet.full_text),
+            description=translation,
             color=discord.Colour.blue(),
         )
         embed.set_author(
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+from .leaderboard import Leaderboard
+from .store import IdolaStore
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+BORDER_ALERT = "border"
+RANK_ALERT = "rank"
+
+
+@dataclass
+class Alert(object):
+    """A one-off notification
+
+    Border alerts fire once the border at rank reaches score. Rank alerts fire once profile_id is ranked below rank.
+    """
+
+    alert_id: int
+    discord_id: int
+    kind: str
+    ranking_type: str
+    rank: int
+    score: Optional[int] = None
+    profile_id: Optional[int] = None
+
+
+class AlertIndex(object):
+    """Alert subscriptions kept sorted by threshold so a refresh only touches the alerts that fire
+
+    Border alerts are grouped by border and sorted by score, every alert at or under a new border value is a prefix
+    of the list and found with one binary search. Rank alerts are grouped by ranking and checked against each new
+    leaderboard snapshot in a single pass. Fired alerts are removed, alerts are persisted in the store.
+    """
+
+    def __init__(self, store: IdolaStore):
+        self.store = store
+        self.alerts: Dict[int, Alert] = {}
+        self.border_alerts: Dict[Tuple[str, int], List[Tuple[int, int]]] = defaultdict(list)
+        self.rank_alerts: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def load(self) -> None:
+        with self.lock:
+            for row in self.store.get_alerts():
+                self._index(Alert(*row))
+        logger.info(f"Loaded {len(self.alerts)} alerts")
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def _index(self, alert: Alert) -> None:
+        self.alerts[alert.alert_id] = alert
+        if alert.kind == BORDER_ALERT:
+            bisect.insort(self.border_alerts[alert.ranking_type, alert.rank], (alert.score, alert.alert_id))
+        else:
+            bisect.insort(self.rank_alerts[alert.ranking_type], (alert.rank, alert.alert_id))
+
+    def _unindex(self, alert: Alert) -> None:
+        del self.alerts[alert.alert_id]
+        if alert.kind == BORDER_ALERT:
+            entries = self.border_alerts[alert.ranking_type, alert.rank]
+            entries.pop(bisect.bisect_left(entries, (alert.score, alert.alert_id)))
+        else:
+            entries = self.rank_alerts[alert.ranking_type]
+            entries.pop(bisect.bisect_left(entries, (alert.rank, alert.alert_id)))
+
+    def add(
+        self,
+        discord_id: int,
+        kind: str,
+        ranking_type: str,
+        rank: int,
+        score: Optional[int] = None,
+        profile_id: Optional[int] = None,
+    ) -> Alert:
+        with self.lock:
+            alert_id = self.store.add_alert(discord_id, kind, ranking_type, rank, score, profile_id)
+            alert = Alert(alert_id, int(discord_id), kind, ranking_type, int(rank), score, profile_id)
+            self._index(alert)
+            return alert
+
+    def remove(self, alert_id: int, discord_id: Optional[int] = None) -> bool:
+        """Removes an alert, only if it belongs to discord_id when given"""
+        with self.lock:
+            alert = self.alerts.get(alert_id)
+            if alert is None or (discord_id is not None and alert.discord_id != discord_id):
+                return False
+            self._unindex(alert)
+            self.store.delete_alerts([alert_id])
+            return True
+
+    def for_user(self, discord_id: int) -> List[Alert]:
+        with self.lock:
+            return [alert for alert in self.alerts.values() if alert.discord_id == discord_id]
+
+    def border_keys(self) -> Set[Tuple[str, int]]:
+        """(ranking_type, rank) of every border someone is waiting on"""
+        with self.lock:
+            return {key for key, entries in self.border_alerts.items() if entries}
+
+    def _fire(self, alerts: List[Alert]) -> List[Alert]:
+        for alert in alerts:
+            self._unindex(alert)
+        self.store.delete_alerts(alert.alert_id for alert in alerts)
+        return alerts
+
+    def check_border(self, ranking_type: str, rank: int, border: Optional[int]) -> List[Alert]:
+        """Fires the alerts waiting on this border to reach at most border"""
+        if not border:
+            return []
+        with self.lock:
+            entries = self.border_alerts.get((ranking_type, rank), [])
+            reached = entries[: bisect.bisect_right(entries, (border, float("inf")))]
+            return self._fire([self.alerts[alert_id] for _, alert_id in reached])
+
+    def check_ranks(self, ranking_type: str, leaderboard: Leaderboard) -> List[Tuple[Alert, Optional[int]]]:
+        """Fires rank alerts whose player is ranked below their rank, returns (alert, current rank) pairs
+
+        A player missing from the leaderboard is below every rank it covers.
+        """
+        fired = []
+        with self.lock:
+            for rank, alert_id in self.rank_alerts.get(ranking_type, []):
+                alert = self.alerts[alert_id]
+                current_rank = leaderboard.rank_of(alert.profile_id)
+                if current_rank is None and rank > len(leaderboard):
+                    continue
+                if current_rank is None or current_rank > rank:
+                    fired.append((alert, current_rank))
+            self._fire([alert for alert, _ in fired])
+        return fired
@@ -7,14 +7,22 @@ import json
 import logging
 import os
 import pickle
-from collections import OrderedDict, defaultdict
+import time
 
 import play_scraper
-import pylru
 import pytz
 import requests
 from dotenv import load_dotenv
 
+from .alerts import AlertIndex
+from .archive import LeaderboardArchive
+from .crawler import LeaderboardCrawler, Ranking
+from .forecast import BorderForecaster
+from .leaderboard import Leaderboard, diff_leaderboards
+from .profiles import ProfileDirectory
+from .store import IdolaStore
+from .util import TTLCache, normalize_name
+
 logger = logging.getLogger(f"idola.{__name__}")
 
 IDOLA_API_URL = "https://game.idola.jp/api"
@@ -35,6 +43,18 @@ IDOLA_GUILD_RANKING_OFFSET = IDOLA_API_URL + "/rod/ranking"
 IDOLA_GUILD_MEMBERLIST = IDOLA_API_URL + "/guild/memberlist"
 IDOLA_GUILD_SEARCH = IDOLA_API_URL + "/guild/search"
 
+# Ranks whose scores are kept in the border history whenever a ranking page containing them is fetched
+SNAPSHOT_RANKS = frozenset((1, 10, 50, 100, 500, 1000, 2000, 5000))
+# Hours over which a border sample's weight in the forecast halves
+BORDER_FORECAST_HALF_LIFE = 12
+LEADERBOARD_CRAWL_SIZE = 5000
+ARENA_LEADERBOARD_SIZE = 1000
+GUILD_LEADERBOARD_SIZE = 100
+LEADERBOARD_CACHE_TTL = 60 * 60
+RANKING_PAGE_CACHE_TTL = 120
+GUILD_PAGE_SIZE = 10
+GUILD_PAGE_REFRESH = 5 * 60
+
 
 def unpack(s):
     return ",".join(map(str, s))
@@ -63,13 +83,15 @@ def lb_bullet(number):
         return number
 
 
-profile_cache = pylru.lrucache(size=10000)
-discord_profile_ids = {}
+HOT_PROFILE_CACHE_SIZE = 1000
+HOME_NOTICE_CACHE_TTL = 300
 
 
-def update_profile_cache(name, profile_id):
-    global profile_cache
-    profile_cache[name] = int(profile_id)
+class AmbiguousProfileName(Exception):
+    def __init__(self, name, matches):
+        super().__init__(f"'{name}' matches {len(matches)} profiles")
+        self.name = name
+        self.matches = matches
 
 
 class HTTPClient(object):
@@ -100,9 +122,55 @@ class HTTPClient(object):
 
 
 class IdolaAPI(object):
-    def __init__(self, user_agent, device_id, device_token, token_key, uuid):
+    def __init__(
+        self,
+        user_agent,
+        device_id,
+        device_token,
+        token_key,
+        uuid,
+        db_location="idola.db",
+        archive_location="archive",
+        arena_party_cache_ttl=300,
+    ):
+        self.store = IdolaStore(db_location)
+        self.profiles = ProfileDirectory(self.store, hot_size=HOT_PROFILE_CACHE_SIZE)
+        self.home_notice_cache = TTLCache(ttl=HOME_NOTICE_CACHE_TTL, size=1)
+        self.arena_party_cache = TTLCache(ttl=arena_party_cache_ttl, size=500)
+        # Forecasts are loaded from the border history per (ranking_type, event_id) the first time they're asked for
+        self.border_forecaster = BorderForecaster(half_life=BORDER_FORECAST_HALF_LIFE)
+        self.forecast_events = set()
+        self.leaderboard_crawler = LeaderboardCrawler(
+            self.store,
+            {
+                "arena": Ranking(
+                    self.get_arena_ranking, self.player_ranking_rows, ARENA_LEADERBOARD_SIZE, event_type="ant"
+                ),
+                "suppression": Ranking(
+                    self.get_raid_battle_ranking, self.player_ranking_rows, LEADERBOARD_CRAWL_SIZE, event_type="raid"
+                ),
+                "creation": Ranking(
+                    self.get_raid_creation_ranking, self.player_ranking_rows, LEADERBOARD_CRAWL_SIZE, event_type="raid"
+                ),
+                "guild": Ranking(
+                    lambda event_id, offset: self.get_cached_guild_page(offset),
+                    self.guild_ranking_rows,
+                    GUILD_LEADERBOARD_SIZE,
+                    page_size=GUILD_PAGE_SIZE,
+                    players=False,
+                ),
+            },
+        )
+        # Snapshots never change once finished so they can be cached by id
+        self.leaderboard_cache = TTLCache(ttl=LEADERBOARD_CACHE_TTL, size=16)
+        self.leaderboard_archive = LeaderboardArchive(archive_location)
+        # Live ranking pages for paged views, long enough that flipping back and forth doesn't refetch
+        self.ranking_page_cache = TTLCache(ttl=RANKING_PAGE_CACHE_TTL, size=256)
+        self.guild_page_cache = TTLCache(ttl=GUILD_PAGE_REFRESH, size=256)
+        self.alerts = AlertIndex(self.store)
         self.load_profile_cache()
         self.load_discord_profile_ids()
+        self.alerts.load()
         self.client = HTTPClient(user_agent)
         self.app_ver = ""
         self.auth_key = ""
@@ -263,28 +331,14 @@ class IdolaAPI(object):
         json_response = response.json()
         home_notice = json_response["replace"]
         self.retrans_key = json_response["retrans_key"]
+        self.home_notice_cache["home_notice"] = home_notice
         return home_notice
 
-    def get_arena_ranking_offset(self, event_id, offset=0):
-        body = {
-            "app_ver": self.app_ver,
-            "res_ver": self.res_ver,
-            "auth_key": self.auth_key,
-            "retrans_key": self.retrans_key,
-            "event_id": event_id,
-            "ranking_offset": offset,
-        }
-        response = self.client.post(IDOLA_ARENA_RANKING_OFFSET, body)
-        json_response = response.json()
-        ranking_list = json_response["replace"]["ranking_list"]
-        ranking_information = defaultdict(dict)
-        for profile in ranking_list:
-            profile_id = profile["friend_profile"]["profile_id"]
-            ranking_information[profile_id]["name"] = profile["friend_profile"]["name"]
-            ranking_information[profile_id]["arena_score_rank"] = profile["score_rank"]
-            ranking_information[profile_id]["arena_score_point"] = profile["score_point"]
-        self.retrans_key = json_response["retrans_key"]
-        return ranking_information
+    def get_cached_home_notice(self):
+        home_notice = self.home_notice_cache.get("home_notice")
+        if home_notice is None:
+            home_notice = self.get_home_notice()
+        return home_notice
 
     def get_arena_party_info(self, profile_id):
         body = {
@@ -327,6 +381,8 @@ class IdolaAPI(object):
         response = self.client.post(IDOLA_ARENA_RANKING_OFFSET, body)
         json_response = response.json()
         ranking_list = json_response["replace"]["ranking_list"]
+        self.update_profile_cache_from_ranking(ranking_list)
+        self.record_border_snapshots("arena", event_id, offset, ranking_list)
         self.retrans_key = json_response["retrans_key"]
         return ranking_list
 
@@ -345,6 +401,8 @@ class IdolaAPI(object):
         response = self.client.post(IDOLA_RAID_RANKING_OFFSET, body)
         json_response = response.json()
         ranking_list = json_response["replace"]["suppression_ranking"]
+        self.update_profile_cache_from_ranking(ranking_list)
+        self.record_border_snapshots("suppression", event_id, offset, ranking_list)
         self.retrans_key = json_response["retrans_key"]
         return ranking_list
 
@@ -363,6 +421,8 @@ class IdolaAPI(object):
         response = self.client.post(IDOLA_RAID_RANKING_OFFSET, body)
         json_response = response.json()
         ranking_list = json_response["replace"]["creator_ranking"]
+        self.update_profile_cache_from_ranking(ranking_list)
+        self.record_border_snapshots("creation", event_id, offset, ranking_list)
         self.retrans_key = json_response["retrans_key"]
         return ranking_list
 
@@ -407,6 +467,7 @@ class IdolaAPI(object):
         response = self.client.post(IDOLA_GUILD_MEMBERLIST, body)
         json_response = response.json()
         guild_member_list = json_response["replace"]["guild_member_list"]
+        self.update_profile_cache_many((member["user_name"], member["user_id"]) for member in guild_member_list)
         self.retrans_key = json_response["retrans_key"]
         return guild_member_list
 
@@ -460,6 +521,10 @@ class IdolaAPI(object):
         jp_datetime = jp_tz.normalize(localised_utc)
         return jp_datetime.strftime("%Y-%m-%d %H:%M:%S %Z%z")
 
+    @staticmethod
+    def datetime_to_epoch(d1):
+        return int(pytz.utc.localize(d1).timestamp())
+
     @staticmethod
     def datetime_difference(d1, d2):
         days = abs((d2 - d1).days)
@@ -519,101 +584,14 @@ class IdolaAPI(object):
             raise Exception("Unknown element id")
 
     def show_arena_ranking_top_100_players(self, event_id=None):
-        players = defaultdict(dict)
         if not event_id:
             event_id = self.get_latest_arena_event_id()
-        top_100_ranking_information = [
-            self.get_arena_ranking_offset(event_id, 0),
-            self.get_arena_ranking_offset(event_id, 20),
-            self.get_arena_ranking_offset(event_id, 40),
-            self.get_arena_ranking_offset(event_id, 60),
-            self.get_arena_ranking_offset(event_id, 80),
-        ]
-        for ranking_information_intervals in top_100_ranking_information:
-            for (
-                profile_id,
-                ranking_information,
-            ) in ranking_information_intervals.items():
-                update_profile_cache(ranking_information["name"], profile_id)
-                players[profile_id]["name"] = ranking_information["name"]
-                players[profile_id]["arena_score_rank"] = ranking_information["arena_score_rank"]
-                players[profile_id]["arena_score_point"] = ranking_information["arena_score_point"]
-        return players
+        return Leaderboard.from_ranking(self.get_arena_ranking(event_id, i) for i in range(0, 99, 20))
 
     def show_arena_ranking_top_500_players(self, event_id=None):
-        players = defaultdict(dict)
         if not event_id:
             event_id = self.get_latest_arena_event_id()
-        top_500_ranking_information = [self.get_arena_ranking_offset(event_id, i) for i in range(0, 499, 20)]
-        for ranking_information_intervals in top_500_ranking_information:
-            for (
-                profile_id,
-                ranking_information,
-            ) in ranking_information_intervals.items():
-                update_profile_cache(ranking_information["name"], profile_id)
-                players[profile_id]["name"] = ranking_information["name"]
-                players[profile_id]["arena_score_rank"] = ranking_information["arena_score_rank"]
-                players[profile_id]["arena_score_point"] = ranking_information["arena_score_point"]
-        return players
-
-    def show_raid_suppression_top_100_players(self, event_id=None):
-        msg = []
-        if not event_id:
-            event_id = self.get_latest_raid_event_id()
-        top_100_ranking_information = [
-            self.get_raid_battle_ranking(event_id, 0),
-            self.get_raid_battle_ranking(event_id, 20),
-            self.get_raid_battle_ranking(event_id, 40),
-            self.get_raid_battle_ranking(event_id, 60),
-            self.get_raid_battle_ranking(event_id, 80),
-        ]
-
-        prev_profile_id = None
-        for ranking_information_intervals in top_100_ranking_information:
-            for ranking_information in sorted(ranking_information_intervals, key=lambda item: item["score_rank"]):
-                name = ranking_information["friend_profile"]["name"]
-                profile_id = ranking_information["friend_profile"]["profile_id"]
-                update_profile_cache(name, profile_id)
-                if profile_id == prev_profile_id:
-                    continue
-                prev_profile_id = ranking_information["friend_profile"]["profile_id"]
-                raid_score_rank = ranking_information["score_rank"]
-                raid_score_point = ranking_information["score_point"]
-                if raid_score_rank > 100:
-                    break
-                msg.append(f"{raid_score_rank}: {raid_score_point:,d} - {name}({profile_id})")
-        return "\n".join(msg)
-
-    def show_raid_creation_top_100_players(self, event_id=None):
-        msg = []
-        if not event_id:
-            event_id = self.get_latest_raid_event_id()
-        top_100_ranking_information = [
-            self.get_raid_creation_ranking(event_id, 0),
-            self.get_raid_creation_ranking(event_id, 20),
-            self.get_raid_creation_ranking(event_id, 40),
-            self.get_raid_creation_ranking(event_id, 60),
-            self.get_raid_creation_ranking(event_id, 80),
-        ]
-
-        prev_profile_id = None
-        for ranking_information_intervals in top_100_ranking_information:
-            for ranking_information in sorted(
-                ranking_information_intervals,
-                key=lambda item: item["score_rank"],
-            ):
-                name = ranking_information["friend_profile"]["name"]
-                profile_id = ranking_information["friend_profile"]["profile_id"]
-                update_profile_cache(name, profile_id)
-                if profile_id == prev_profile_id:
-                    continue
-                prev_profile_id = ranking_information["friend_profile"]["profile_id"]
-                raid_score_rank = ranking_information["score_rank"]
-                raid_score_point = ranking_information["score_point"]
-                if raid_score_rank > 100:
-                    break
-                msg.append(f"{raid_score_rank}: {raid_score_point:,d} - {name}({profile_id})")
-        return "\n".join(msg)
+        return Leaderboard.from_ranking(self.get_arena_ranking(event_id, i) for i in range(0, 499, 20))
 
     def show_top_100_guilds(self):
         msg = []
@@ -767,7 +745,8 @@ class IdolaAPI(object):
 
     def get_top_100_raid_creation_border(self, event_id=None):
         try:
-            event_id = self.get_latest_raid_event_id()
+            if not event_id:
+                event_id = self.get_latest_raid_event_id()
             ranking_information = self.get_raid_creation_ranking(event_id, 99)
             sorted_ranking_information = sorted(
                 [player_information["score_point"] for player_information in ranking_information],
@@ -780,7 +759,8 @@ class IdolaAPI(object):
 
     def get_top_500_raid_creation_border(self, event_id=None):
         try:
-            event_id = self.get_latest_raid_event_id()
+            if not event_id:
+                event_id = self.get_latest_raid_event_id()
             ranking_information = self.get_raid_creation_ranking(event_id, 499)
             sorted_ranking_information = sorted(
                 [player_information["score_point"] for player_information in ranking_information],
@@ -833,27 +813,32 @@ class IdolaAPI(object):
             logger.exception(e)
             return None
 
+    def get_cached_guild_page(self, offset):
+        """Guild ranking page at offset, shared by every request in the same refresh window
+
+        Keying on the window rather than the fetch time means the pages of one range all come from the same window.
+        """
+        key = (offset, int(time.time() // GUILD_PAGE_REFRESH))
+        ranking_list = self.guild_page_cache.get(key)
+        if ranking_list is None:
+            ranking_list = self.get_guild_ranking(offset)
+            self.guild_page_cache[key] = ranking_list
+        return ranking_list
+
     def get_top_100_guilds(self):
-        try:
-            top_100_guilds = {}
-            for offset in range(0, 100, 10):
-                ranking_list = self.get_guild_ranking(offset)
-                for guild in ranking_list:
-                    guild_id = int(guild["guild_id"])
-                    top_100_guilds[guild_id] = guild
-            return top_100_guilds
-        except IndexError as e:
-            logger.exception(e)
-            return None
+        return self.get_range_guilds(1, 100)
 
     def get_range_guilds(self, start: int, end: int):
         try:
             guilds = {}
-            for offset in range(start, end, 10):
-                ranking_list = self.get_guild_ranking(offset)
+            first_offset = (max(start, 1) - 1) // GUILD_PAGE_SIZE * GUILD_PAGE_SIZE
+            for offset in range(first_offset, end, GUILD_PAGE_SIZE):
+                ranking_list = self.get_cached_guild_page(offset)
                 for guild in ranking_list:
                     guild_id = int(guild["guild_id"])
                     guilds[guild_id] = guild
+                if len(ranking_list) < GUILD_PAGE_SIZE:
+                    break
             return guilds
         except IndexError as e:
             logger.exception(e)
@@ -868,8 +853,23 @@ class IdolaAPI(object):
         image_name = s_char_id[:-2] + "%20" + s_char_id[-2:]
         return char_image_template.format(image_name)
 
+    def get_cached_arena_party(self, profile_id):
+        """Party details for profile_id in the current arena event, shared by every view of the team"""
+        event_id = self.get_cached_home_notice()["ant"]["event_id"]
+        key = (int(profile_id), event_id)
+        arena_party = self.arena_party_cache.get(key)
+        if arena_party is None:
+            arena_party = {"party_info": self.get_arena_party_info(profile_id), "composition": None}
+            self.arena_party_cache[key] = arena_party
+        return arena_party
+
     def get_arena_team_composition(self, profile_id):
-        party_info = self.get_arena_party_info(profile_id)
+        arena_party = self.get_cached_arena_party(profile_id)
+        if arena_party["composition"] is None:
+            arena_party["composition"] = self.render_arena_team_composition(profile_id, arena_party["party_info"])
+        return arena_party["composition"]
+
+    def render_arena_team_composition(self, profile_id, party_info):
         name = party_info["player_name"]
         arena_team_score = party_info["strength_value"]
         avatar_url = self.get_image_from_character_id(party_info["avator_character_id"])
@@ -947,7 +947,7 @@ class IdolaAPI(object):
         except Exception:
             chaos_idomag_name = None
 
-        update_profile_cache(name, profile_id)
+        self.update_profile_cache(name, profile_id)
         return {
             "player_name": name,
             "avatar_url": avatar_url,
@@ -963,70 +963,279 @@ class IdolaAPI(object):
             "party_info": party_info,
         }
 
-    def get_profile_id_from_name(self, name):
-        if name in profile_cache:
-            return profile_cache.get(name)
+    def get_profile_id_from_name(self, name, crawl=True):
+        profile_id = self.profiles.get(name)
+        if profile_id is not None:
+            return profile_id
+
+        matches = self.find_profiles_by_name(name)
+        if not matches and crawl:
+            # Nothing known locally, the arena top 100 is the most likely place to find them
+            self.show_arena_ranking_top_100_players()
+            matches = self.find_profiles_by_name(name)
+        if not matches:
+            return None
+
+        exact_matches = [match for match in matches if normalize_name(match[0]) == normalize_name(name)]
+        if len(exact_matches) == 1:
+            return exact_matches[0][1]
+        if len(matches) == 1:
+            return matches[0][1]
+        raise AmbiguousProfileName(name, exact_matches or matches)
 
-        players = self.show_arena_ranking_top_100_players()
-        for profile_id, ranking_information in players.items():
-            if ranking_information["name"].startswith(name):
-                return profile_id
-        return None
+    def find_profiles_by_name(self, name, limit=10):
+        return self.profiles.search(name, limit)
 
-    def get_arena_team_composition_from_name(self, name):
-        profile_id = self.get_profile_id_from_name(name)
+    def get_arena_team_composition_from_name(self, name, crawl=True):
+        profile_id = self.get_profile_id_from_name(name, crawl)
         if not profile_id:
             return None
         return self.get_arena_team_composition(int(profile_id))
 
     def get_raid_event_end_date(self):
-        home_notice = self.get_home_notice()
+        home_notice = self.get_cached_home_notice()
         raid_end_date = home_notice["raid"]["end_date"]
         return self.epoch_to_datetime(raid_end_date) - datetime.timedelta(hours=5)
 
     def get_arena_event_end_date(self):
-        home_notice = self.get_home_notice()
+        home_notice = self.get_cached_home_notice()
         arena_end_date = home_notice["ant"]["end_date"]
         return self.epoch_to_datetime(arena_end_date) - datetime.timedelta(hours=5)
 
+    def update_profile_cache(self, name, profile_id):
+        self.profiles.update(name, profile_id)
+
+    def update_profile_cache_many(self, profiles):
+        self.profiles.update_many(profiles)
+
+    def record_border_snapshots(self, ranking_type, event_id, offset, ranking_list):
+        """Keeps the scores of any SNAPSHOT_RANKS found on a ranking page starting at offset"""
+        scores = sorted((player["score_point"] for player in ranking_list), reverse=True)
+        now = time.time()
+        snapshots = [
+            (ranking_type, event_id, offset + i + 1, now, score)
+            for i, score in enumerate(scores)
+            if offset + i + 1 in SNAPSHOT_RANKS
+        ]
+        # Stored under the forecaster lock, otherwise a forecast loading this event from the store in between would
+        # pick these samples up and they'd be added again below
+        with self.border_forecaster.lock:
+            self.store.add_border_snapshots(snapshots)
+            if (ranking_type, event_id) in self.forecast_events:
+                self.border_forecaster.add(snapshots)
+
+    def get_border_history(self, ranking_type, rank, event_id=None, start=None, end=None):
+        """Recorded (timestamp, score) samples for a border, defaults to the latest event that has any"""
+        if not event_id:
+            event_id = self.store.get_latest_border_event_id(ranking_type)
+            if event_id is None:
+                return None, []
+        return event_id, self.store.get_border_history(ranking_type, event_id, rank, start, end)
+
+    def get_border_forecast(self, ranking_type, event_id, end_date):
+        """Projected borders at end_date for every recorded rank of an event, keyed by rank"""
+        with self.border_forecaster.lock:
+            if (ranking_type, event_id) not in self.forecast_events:
+                self.border_forecaster.add(
+                    (ranking_type, event_id, rank, ts, score)
+                    for rank, ts, score in self.store.get_border_snapshots(ranking_type, event_id)
+                )
+                self.forecast_events.add((ranking_type, event_id))
+        forecast = self.border_forecaster.forecast(
+            self.datetime_to_epoch(end_date),
+            ((ranking_type, event_id, rank) for rank in sorted(SNAPSHOT_RANKS)),
+        )
+        return {rank: projection for (_, _, rank), projection in forecast.items()}
+
+    @staticmethod
+    def player_ranking_rows(ranking_list):
+        # Player names are kept up to date in the profiles table, the snapshot only needs the id
+        return [
+            (player["friend_profile"]["profile_id"], player["score_rank"], player["score_point"], None)
+            for player in ranking_list
+        ]
+
+    @staticmethod
+    def guild_ranking_rows(ranking_list):
+        # Guild rankings are compared by rank alone
+        return [(int(guild["guild_id"]), guild["rank"], 0, guild["guild_name"]) for guild in ranking_list]
+
+    def get_ranking_page(self, ranking_type, offset):
+        """(profile_id, rank, score, name) rows of one live page of a ranking's current event"""
+        ranking = self.leaderboard_crawler.rankings[ranking_type]
+        event_id = self.get_cached_home_notice()[ranking.event_type]["event_id"] if ranking.event_type else 0
+        key = (ranking_type, event_id, offset)
+        rows = self.ranking_page_cache.get(key)
+        if rows is None:
+            page = ranking.fetch(event_id, offset)
+            rows = ranking.rows(page)
+            if ranking.players:
+                rows = [
+                    (profile_id, rank, score, player["friend_profile"]["name"])
+                    for (profile_id, rank, score, _), player in zip(rows, page)
+                ]
+            self.ranking_page_cache[key] = rows
+        return rows
+
+    def get_ranking_range(self, ranking_type, start, end):
+        """Live leaderboard of the players ranked from start to end, fetching only the pages that cover them"""
+        page_size = self.leaderboard_crawler.rankings[ranking_type].page_size
+        first_offset = (max(start, 1) - 1) // page_size * page_size
+        rows = []
+        for offset in range(first_offset, end, page_size):
+            page = self.get_ranking_page(ranking_type, offset)
+            rows.extend((rank, score, profile_id, name) for profile_id, rank, score, name in page)
+            if len(page) < page_size:
+                break
+        return Leaderboard.from_rows(rows).slice_ranks(start, end)
+
+    def get_leaderboard_snapshot(self, ranking_type):
+        """Newest crawled leaderboard of a ranking as a dict with its event_id and finished_at, None before any crawl"""
+        snapshots = self.store.get_leaderboard_snapshots(ranking_type)
+        if not snapshots:
+            return None
+        return self.load_leaderboard_snapshot(*snapshots[0])
+
+    def load_leaderboard_snapshot(self, snapshot_id, event_id, finished_at):
+        leaderboard = self.leaderboard_cache.get(snapshot_id)
+        if leaderboard is None:
+            leaderboard = Leaderboard.from_rows(self.store.get_leaderboard_rows(snapshot_id))
+            self.leaderboard_cache[snapshot_id] = leaderboard
+        return {
+            "snapshot_id": snapshot_id,
+            "event_id": event_id,
+            "finished_at": finished_at,
+            "leaderboard": leaderboard,
+        }
+
+    def get_leaderboard_diff(self, ranking_type, since_snapshot_id=None):
+        """Changes from since_snapshot_id, or the snapshot before the newest, to the newest snapshot of a ranking
+
+        Returns (old snapshot, new snapshot, diff) or None when there's nothing to compare within one event.
+        """
+        snapshots = self.store.get_leaderboard_snapshots(ranking_type, limit=2)
+        if not snapshots:
+            return None
+        new = snapshots[0]
+        old = self.store.get_leaderboard_snapshot(since_snapshot_id) if since_snapshot_id else None
+        if old is not None and old[1] == ranking_type:
+            old = (old[0], old[2], old[3])
+        elif len(snapshots) > 1:
+            old = snapshots[1]
+        else:
+            old = None
+        if old is None or old[0] == new[0] or old[1] != new[1]:
+            return None
+        old = self.load_leaderboard_snapshot(*old)
+        new = self.load_leaderboard_snapshot(*new)
+        return old, new, diff_leaderboards(old["leaderboard"], new["leaderboard"])
+
+    def archive_finished_events(self, grace_period=0):
+        """Writes the final crawled leaderboard of every finished event to the archive
+
+        An event is finished once another one has replaced it in the home notice, or grace_period seconds after its
+        end_date so the crawl taken after the end lands first. Returns (ranking_type, event_id) of what was archived.
+        """
+        home_notice = self.get_cached_home_notice()
+        now = self.get_current_time()
+        unfinished = self.store.get_unfinished_leaderboard_snapshots()
+        crawling = {(ranking_type, event_id) for _, ranking_type, event_id, *_ in unfinished}
+        archived = []
+        for ranking_type, ranking in self.leaderboard_crawler.rankings.items():
+            if not ranking.event_type:
+                continue
+            event = home_notice[ranking.event_type]
+            end_date = self.epoch_to_datetime(event["end_date"]) - datetime.timedelta(hours=5)
+            current_ended = (now - end_date).total_seconds() > grace_period
+            for snapshot in self.store.get_final_leaderboard_snapshots(ranking_type):
+                event_id = snapshot[1]
+                if self.leaderboard_archive.has(ranking_type, event_id) or (ranking_type, event_id) in crawling:
+                    continue
+                if event_id == event["event_id"] and not current_ended:
+                    continue
+                leaderboard = self.load_leaderboard_snapshot(*snapshot)["leaderboard"]
+                self.leaderboard_archive.write(ranking_type, event_id, leaderboard, snapshot[2])
+                archived.append((ranking_type, event_id))
+        return archived
+
+    def get_archived_event_top(self, ranking_type, event_id, count=100):
+        """Top count players of an archived event, None when the event isn't archived"""
+        event = self.leaderboard_archive.open(ranking_type, event_id)
+        return None if event is None else event.top(count)
+
+    def get_archived_rank_history(self, ranking_type, profile_id, events=10):
+        """(event_id, (rank, score) or None) of a player over the newest archived events"""
+        return self.leaderboard_archive.player_history(ranking_type, profile_id, events)
+
+    def update_profile_cache_from_ranking(self, ranking_list):
+        self.update_profile_cache_many(
+            (profile["friend_profile"]["name"], profile["friend_profile"]["profile_id"]) for profile in ranking_list
+        )
+
     def save_profile_cache(self):
-        profile_dict = OrderedDict()
-        for k, v in profile_cache.items():
-            profile_dict[k] = v
-        pickle.dump(profile_dict, open("profile_cache.p", "wb"))
+        # Profiles are written to the store as they are seen, this only folds the WAL back into the database
+        self.store.checkpoint()
+        logger.info(f"Profile directory: {self.profiles.stats()}")
         return True
 
     def load_profile_cache(self):
-        global profile_cache
+        self.import_legacy_profile_cache()
+        self.profiles.warm()
+        logger.info(f"Profile cache loaded ({len(self.profiles)} known profiles)")
+        return True
+
+    def import_legacy_profile_cache(self, filepath="profile_cache.p"):
         try:
-            profile_dict = pickle.load(open("profile_cache.p", "rb"))
-            for k, v in reversed(profile_dict.items()):
-                profile_cache[k] = v
-        except FileNotFoundError as e:
-            logger.error(f"Error: Could not load profile_cache - {e}")
+            with open(filepath, "rb") as f:
+                profile_dict = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (EOFError, pickle.UnpicklingError) as e:
+            logger.error(f"Error: Could not unpickle {filepath} - {e}")
             return False
-        logger.info("Profile cache loaded")
+        # Most recently used entries come first, keep that ordering through last_seen
+        now = time.time()
+        self.store.upsert_profile_rows(
+            (name, profile_id, now - len(profile_dict) + i)
+            for i, (name, profile_id) in enumerate(reversed(profile_dict.items()))
+        )
+        os.replace(filepath, filepath + ".migrated")
+        logger.info(f"Imported {len(profile_dict)} profiles from {filepath}")
         return True
 
     def register_discord_profile_id(self, discord_id, profile_id):
-        discord_profile_ids[discord_id] = profile_id
+        self.store.set_discord_profile_id(discord_id, profile_id)
+        # Pick up their ranks from the crawls that already happened instead of waiting for the next ones
+        for ranking_type, ranking in self.leaderboard_crawler.rankings.items():
+            snapshots = self.store.get_leaderboard_snapshots(ranking_type) if ranking.players else []
+            for snapshot_id, _, _ in snapshots:
+                self.store.record_user_ranks(snapshot_id, profile_id)
         return True
 
     def get_profile_id_from_discord_id(self, discord_id):
-        return discord_profile_ids.get(discord_id, None)
+        return self.store.get_discord_profile_id(discord_id)
 
     def save_discord_profile_ids(self):
-        pickle.dump(discord_profile_ids, open("discord_profile_ids.p", "wb"))
+        self.store.checkpoint()
         return True
 
     def load_discord_profile_ids(self):
-        global discord_profile_ids
+        self.import_legacy_discord_profile_ids()
+        logger.info(f"Discord ID DB loaded ({self.store.count_discord_profiles()} registered)")
+        return True
+
+    def import_legacy_discord_profile_ids(self, filepath="discord_profile_ids.p"):
         try:
-            discord_profile_ids = pickle.load(open("discord_profile_ids.p", "rb"))
-        except FileNotFoundError as e:
-            logger.error(f"Error: Could not load profile_cache - {e}")
+            with open(filepath, "rb") as f:
+                discord_profile_ids = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except (EOFError, pickle.UnpicklingError) as e:
+            logger.error(f"Error: Could not unpickle {filepath} - {e}")
             return False
-        logger.info("Discord ID DB loaded")
+        self.store.set_discord_profile_ids(discord_profile_ids)
+        os.replace(filepath, filepath + ".migrated")
+        logger.info(f"Imported {len(discord_profile_ids)} discord profile ids from {filepath}")
         return True
 
     def parse_symbol_option_bonus(self, option_bonus_list):
@@ -1046,7 +1255,7 @@ class IdolaAPI(object):
 
     def get_arena_next_options(self, profile_id):
         option_char = []
-        party_info = self.get_arena_party_info(profile_id)
+        party_info = self.get_cached_arena_party(profile_id)["party_info"]
         for character in itertools.chain(party_info["law"], party_info["chaos"]):
             character_name = self.get_name_from_id(character["character"]["char_id"])
             weapon_symbol = self.get_name_from_id(character["weapon_symbol"]["symbol_id"])
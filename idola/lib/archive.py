@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import shutil
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .leaderboard import Leaderboard
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+class EventArchive(object):
+    """Reader for one archived event leaderboard
+
+    Numeric columns are memory-mapped so a lookup only pages in what it touches, the names column is compressed and
+    only decompressed when names are asked for.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.columns = {}
+        self._names = None
+
+    def __len__(self) -> int:
+        return self.meta["size"]
+
+    def column(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            self.columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self.columns[name]
+
+    @property
+    def names(self) -> List[str]:
+        if self._names is None:
+            with open(os.path.join(self.path, "names.zlib"), "rb") as f:
+                data = zlib.decompress(f.read()).decode("utf-8")
+            self._names = data.split("\n") if data else []
+        return self._names
+
+    def top(self, count: int) -> Leaderboard:
+        count = min(count, len(self))
+        return Leaderboard(
+            np.array(self.column("ranks")[:count], dtype=np.int64),
+            np.array(self.column("scores")[:count]),
+            np.array(self.column("profile_ids")[:count]),
+            self.names[:count],
+        )
+
+    def get(self, profile_id: int) -> Optional[Tuple[int, int]]:
+        """(rank, score) of a player, a binary search over the memory-mapped id index"""
+        sorted_ids = self.column("sorted_ids")
+        i = int(np.searchsorted(sorted_ids, profile_id))
+        if i >= len(sorted_ids) or sorted_ids[i] != profile_id:
+            return None
+        position = int(self.column("id_order")[i])
+        return int(self.column("ranks")[position]), int(self.column("scores")[position])
+
+
+class LeaderboardArchive(object):
+    """Final leaderboards of finished events, one directory of columns per ranking and event"""
+
+    def __init__(self, location: str = "archive"):
+        self.location = location
+
+    def path(self, ranking_type: str, event_id: int) -> str:
+        return os.path.join(self.location, ranking_type, str(int(event_id)))
+
+    def has(self, ranking_type: str, event_id: int) -> bool:
+        return os.path.exists(os.path.join(self.path(ranking_type, event_id), "meta.json"))
+
+    def write(self, ranking_type: str, event_id: int, leaderboard: Leaderboard, finished_at: float) -> None:
+        path = self.path(ranking_type, event_id)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        columns = {
+            "ranks": leaderboard.ranks.astype(np.int32),
+            "scores": leaderboard.scores,
+            "profile_ids": leaderboard.profile_ids,
+            "sorted_ids": leaderboard.sorted_ids,
+            "id_order": leaderboard.id_order.astype(np.int32),
+        }
+        for name, column in columns.items():
+            np.save(os.path.join(tmp_path, f"{name}.npy"), np.ascontiguousarray(column))
+        with open(os.path.join(tmp_path, "names.zlib"), "wb") as f:
+            f.write(zlib.compress("\n".join(name.replace("\n", " ") for name in leaderboard.names).encode("utf-8"), 9))
+        # meta.json goes last, an archive without it is treated as unfinished
+        with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "ranking_type": ranking_type,
+                    "event_id": int(event_id),
+                    "finished_at": finished_at,
+                    "size": len(leaderboard),
+                },
+                f,
+            )
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        logger.info(f"Archived {ranking_type} event {event_id} ({len(leaderboard)} players) to {path}")
+
+    def events(self, ranking_type: str) -> List[int]:
+        """Archived event ids of a ranking, newest first"""
+        directory = os.path.join(self.location, ranking_type)
+        if not os.path.isdir(directory):
+            return []
+        event_ids = [int(name) for name in os.listdir(directory) if name.isdigit() and self.has(ranking_type, name)]
+        return sorted(event_ids, reverse=True)
+
+    def open(self, ranking_type: str, event_id: int) -> Optional[EventArchive]:
+        if not self.has(ranking_type, event_id):
+            return None
+        return EventArchive(self.path(ranking_type, event_id))
+
+    def player_history(self, ranking_type: str, profile_id: int, events: int = 10) -> List[Tuple[int, Optional[tuple]]]:
+        """(event_id, (rank, score) or None) for a player over the newest archived events"""
+        return [
+            (event_id, EventArchive(self.path(ranking_type, event_id)).get(profile_id))
+            for event_id in self.events(ranking_type)[:events]
+        ]
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import time
+from collections import defaultdict, deque
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+class ChannelRenamer(object):
+    """Renames channels only when their name changes, staying inside Discord's per-channel rename limit
+
+    Discord allows a channel to be renamed twice every ten minutes, anything past that sits in the rate limiter and
+    holds up other requests. Renames that would go over the limit are skipped, the next update supplies the latest
+    name for that channel anyway.
+    """
+
+    RENAME_LIMIT = 2
+    RENAME_PERIOD = 600
+
+    def __init__(self):
+        self.names = {}
+        self.renamed_at = defaultdict(lambda: deque(maxlen=self.RENAME_LIMIT))
+        self.skipped = 0
+
+    def needs_rename(self, channel, name: str) -> bool:
+        return name != self.names.get(channel.id, channel.name)
+
+    def can_rename(self, channel, now: float) -> bool:
+        renamed_at = self.renamed_at[channel.id]
+        return len(renamed_at) < self.RENAME_LIMIT or now - renamed_at[0] >= self.RENAME_PERIOD
+
+    async def rename(self, channel_names: dict) -> int:
+        """Applies {channel: name} concurrently and returns how many channels were renamed"""
+        now = time.monotonic()
+        renames = []
+        for channel, name in channel_names.items():
+            if channel is None or not self.needs_rename(channel, name):
+                continue
+            if not self.can_rename(channel, now):
+                logger.info(f"Rename of {channel.name} to {name} deferred by rate limit")
+                self.skipped += 1
+                continue
+            renames.append(self._rename(channel, name))
+        return sum(await asyncio.gather(*renames))
+
+    async def _rename(self, channel, name: str) -> bool:
+        try:
+            await channel.edit(name=name)
+        except Exception as e:
+            logger.exception(e)
+            return False
+        # Only a rename that went through counts, a failed one is retried with the next update
+        self.renamed_at[channel.id].append(time.monotonic())
+        self.names[channel.id] = name
+        return True
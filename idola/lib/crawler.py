@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .store import IdolaStore
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+@dataclass
+class Ranking(object):
+    """How to page through one ranking
+
+    fetch(event_id, offset) returns a raw page and rows(page) turns it into (profile_id, rank, score, name) rows.
+    event_type is the home notice key holding the ranking's event, None for rankings that aren't tied to an event.
+    players is False for rankings of something other than players, those aren't tracked for registered profiles.
+    """
+
+    fetch: Callable[[int, int], list]
+    rows: Callable[[list], List[Tuple[int, int, int, str]]]
+    size: int
+    page_size: int = 20
+    event_type: Optional[str] = None
+    players: bool = True
+
+
+class LeaderboardCrawler(object):
+    """Crawls whole rankings into leaderboard snapshots, a page at a time
+
+    Every page is written together with the crawl's next offset, so a restart picks the crawl back up where it
+    stopped. The game API chains a retrans_key through every request so pages can't be fetched in parallel. Instead
+    step_page() fetches a single page, callers submit it to the API worker one page at a time so commands waiting on
+    the same worker get in between pages, and stop after pages_per_step pages to leave the rest for the next run.
+    """
+
+    def __init__(self, store: IdolaStore, rankings: Dict[str, Ranking], pages_per_step: int = 50, keep: int = 48):
+        self.store = store
+        self.rankings = rankings
+        self.pages_per_step = pages_per_step
+        self.keep = keep
+
+    def is_crawling(self) -> bool:
+        return bool(self.store.get_unfinished_leaderboard_snapshots())
+
+    def start(self, event_ids: Dict[str, int]) -> None:
+        """Starts a crawl of every ranking that isn't already being crawled, event_ids is keyed by event_type"""
+        crawling = {ranking_type for _, ranking_type, *_ in self.store.get_unfinished_leaderboard_snapshots()}
+        for ranking_type, ranking in self.rankings.items():
+            if ranking_type in crawling:
+                continue
+            event_id = event_ids[ranking.event_type] if ranking.event_type else 0
+            self.store.create_leaderboard_snapshot(ranking_type, event_id, ranking.size)
+
+    def step_page(self) -> Tuple[bool, Optional[Tuple[int, str]]]:
+        """Fetches the next page of the oldest crawl in progress
+
+        Returns whether any crawl is left and the (snapshot_id, ranking_type) this page finished, if it finished one.
+        """
+        for snapshot_id, ranking_type, event_id, size, offset in self.store.get_unfinished_leaderboard_snapshots():
+            ranking = self.rankings.get(ranking_type)
+            if ranking is None:
+                self.store.delete_leaderboard_snapshots([snapshot_id])
+                continue
+            if offset < size:
+                rows = ranking.rows(ranking.fetch(event_id, offset))
+                # A short page means the end of the ranking
+                offset = offset + ranking.page_size if len(rows) >= ranking.page_size else size
+                self.store.add_leaderboard_page(snapshot_id, rows, offset)
+            if offset < size:
+                return True, None
+            self.store.finish_leaderboard_snapshot(snapshot_id)
+            if ranking.players:
+                self.store.record_user_ranks(snapshot_id)
+            self.store.prune_leaderboard_snapshots(ranking_type, self.keep)
+            logger.info(f"Finished {ranking_type} leaderboard snapshot {snapshot_id} for event {event_id}")
+            return self.is_crawling(), (snapshot_id, ranking_type)
+        return False, None
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+def monotone_slopes(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Fritsch-Carlson tangents, these keep a cubic Hermite interpolant monotone wherever the data is"""
+    h = np.diff(x)
+    delta = np.diff(y) / h
+    slopes = np.zeros_like(y)
+    slopes[0] = delta[0]
+    slopes[-1] = delta[-1]
+    if len(x) > 2:
+        w1 = 2 * h[1:] + h[:-1]
+        w2 = h[1:] + 2 * h[:-1]
+        same_sign = delta[:-1] * delta[1:] > 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            harmonic = (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:])
+        slopes[1:-1] = np.where(same_sign, harmonic, 0)
+    return slopes
+
+
+def monotone_interpolate(x: np.ndarray, y: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Piecewise cubic Hermite interpolation of y(x) at points, x must be strictly increasing"""
+    if len(x) == 1:
+        return np.full(len(points), y[0], dtype=float)
+    slopes = monotone_slopes(x, y)
+    i = np.clip(np.searchsorted(x, points, side="right") - 1, 0, len(x) - 2)
+    h = x[i + 1] - x[i]
+    t = (points - x[i]) / h
+    t2 = t * t
+    t3 = t2 * t
+    return (
+        (2 * t3 - 3 * t2 + 1) * y[i]
+        + (t3 - 2 * t2 + t) * h * slopes[i]
+        + (-2 * t3 + 3 * t2) * y[i + 1]
+        + (t3 - t2) * h * slopes[i + 1]
+    )
+
+
+def estimate_borders(samples: Dict[int, Optional[int]], ranks: Iterable[int]) -> Dict[int, Tuple[int, int]]:
+    """Estimates borders at ranks from exact borders sampled at a few other ranks
+
+    Scores fall off roughly with the log of the rank so the curve is fitted against log(rank). Returns
+    {rank: (estimate, error)} for the ranks inside the sampled range, where error bounds how far the real border can
+    be from the estimate: a border always sits between the sampled borders either side of it.
+    """
+    known = sorted((rank, score) for rank, score in samples.items() if score)
+    if not known:
+        return {}
+    sample_ranks = np.array([rank for rank, _ in known], dtype=float)
+    # Samples are fetched moments apart, keep them in order so a border never looks like it rises with rank
+    sample_scores = np.minimum.accumulate(np.array([score for _, score in known], dtype=float))
+
+    ranks = np.array(sorted(set(ranks)), dtype=float)
+    ranks = ranks[(ranks >= sample_ranks[0]) & (ranks <= sample_ranks[-1])]
+    if not len(ranks):
+        return {}
+    estimates = monotone_interpolate(np.log(sample_ranks), sample_scores, np.log(ranks))
+
+    i = np.searchsorted(sample_ranks, ranks, side="left")
+    exact = sample_ranks[np.minimum(i, len(sample_ranks) - 1)] == ranks
+    upper = sample_scores[np.maximum(i - 1, 0)]
+    lower = sample_scores[np.minimum(i, len(sample_scores) - 1)]
+    errors = np.where(exact, 0, np.maximum(upper - estimates, estimates - lower))
+    estimates = np.where(exact, sample_scores[np.minimum(i, len(sample_scores) - 1)], estimates)
+    return {
+        int(rank): (int(round(estimate)), int(round(error))) for rank, estimate, error in zip(ranks, estimates, errors)
+    }
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+import logging
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, Sequence
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+PLAYER_FIELDS = ("rank", "score", "profile_id", "name")
+GUILD_FIELDS = ("rank", "score", "guild_id", "name")
+
+
+def csv_lines(rows: Iterable[tuple], fields: Sequence[str]) -> Iterator[str]:
+    """CSV lines with a header, one row at a time through a reused buffer"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in _with_header(rows, fields):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def jsonl_lines(rows: Iterable[tuple], fields: Sequence[str]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n"
+
+
+def _with_header(rows: Iterable[tuple], fields: Sequence[str]) -> Iterator[Sequence]:
+    yield fields
+    yield from rows
+
+
+EXPORT_FORMATS: Dict[str, Callable[[Iterable[tuple], Sequence[str]], Iterator[str]]] = {
+    "csv": csv_lines,
+    "jsonl": jsonl_lines,
+}
+
+
+def export_rows(rows: Iterable[tuple], file_format: str, f: BinaryIO, fields: Sequence[str] = PLAYER_FIELDS) -> int:
+    """Streams rows into f as utf-8 csv or jsonl, returns how many rows were written"""
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    for line in EXPORT_FORMATS[file_format](counted(rows), fields):
+        f.write(line.encode("utf-8"))
+    return count
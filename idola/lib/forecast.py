@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+SERIES_KEY = Tuple[str, int, int]
+
+
+class BorderForecaster(object):
+    """End of event border projections from a weighted linear trend per border
+
+    Each border (ranking_type, event_id, rank) keeps running weighted sums for a least squares line fit, so a new
+    sample is folded in with a few additions instead of refitting the whole history. The weight of a sample doubles
+    every half_life hours after the first sample of its series, so the fit follows the recent pace of the border
+    rather than the slow start of the event. Every series is projected at once with array operations.
+    """
+
+    def __init__(self, half_life: float = 12, capacity: int = 64):
+        self.half_life = half_life
+        self.index: Dict[SERIES_KEY, int] = {}
+        self.keys: List[SERIES_KEY] = []
+        # Rows are the weighted sums of 1, t, t^2, y and t * y with t in hours since the series origin
+        self.sums = np.zeros((5, capacity))
+        self.origin = np.zeros(capacity)
+        self.count = np.zeros(capacity, dtype=np.int64)
+        self.last_ts = np.zeros(capacity)
+        self.last_score = np.zeros(capacity)
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _slot(self, key: SERIES_KEY, ts: float) -> int:
+        slot = self.index.get(key)
+        if slot is not None:
+            return slot
+        slot = len(self.keys)
+        if slot == self.origin.shape[0]:
+            self._grow()
+        self.index[key] = slot
+        self.keys.append(key)
+        self.origin[slot] = ts
+        return slot
+
+    def _grow(self) -> None:
+        capacity = self.origin.shape[0] * 2
+        self.sums = np.pad(self.sums, ((0, 0), (0, capacity - self.sums.shape[1])))
+        for name in ("origin", "count", "last_ts", "last_score"):
+            array = getattr(self, name)
+            setattr(self, name, np.pad(array, (0, capacity - array.shape[0])))
+
+    def add(self, samples: Iterable[Tuple[str, int, int, float, int]]) -> None:
+        """Folds in (ranking_type, event_id, rank, ts, score) samples, in any order"""
+        with self.lock:
+            rows = [
+                (self._slot((ranking_type, int(event_id), int(rank)), ts), ts, score)
+                for ranking_type, event_id, rank, ts, score in samples
+            ]
+            if not rows:
+                return
+            slots, ts, scores = (np.array(column) for column in zip(*rows))
+            slots = slots.astype(np.int64)
+            t = (ts - self.origin[slots]) / 3600
+            w = np.exp2(t / self.half_life)
+            np.add.at(self.sums, (slice(None), slots), np.stack((w, w * t, w * t * t, w * scores, w * t * scores)))
+            np.add.at(self.count, slots, 1)
+
+            # Latest sample of each series in this batch, only kept if it is newer than what was seen before
+            order = np.argsort(ts, kind="stable")[::-1]
+            _, first = np.unique(slots[order], return_index=True)
+            newest = order[first]
+            newest = newest[ts[newest] >= self.last_ts[slots[newest]]]
+            self.last_ts[slots[newest]] = ts[newest]
+            self.last_score[slots[newest]] = scores[newest]
+
+    def forecast(self, end_ts: float, keys: Optional[Iterable[SERIES_KEY]] = None) -> Dict[SERIES_KEY, dict]:
+        """Projected score at end_ts for each series with at least two samples"""
+        with self.lock:
+            n = len(self.keys)
+            w, wt, wtt, wy, wty = self.sums[:, :n]
+            denominator = w * wtt - wt * wt
+            fitted = (self.count[:n] >= 2) & (denominator > 1e-9 * w * w)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                slope = np.where(fitted, (w * wty - wt * wy) / denominator, 0)
+            # Borders never go down, a falling fit is noise
+            slope = np.maximum(slope, 0)
+            intercept = np.where(w > 0, (wy - slope * wt) / np.where(w > 0, w, 1), 0)
+            end_t = (end_ts - self.origin[:n]) / 3600
+            projected = np.maximum(intercept + slope * end_t, self.last_score[:n])
+
+            slots = range(n) if keys is None else [self.index[key] for key in keys if key in self.index]
+            return {
+                self.keys[slot]: {
+                    "latest": int(self.last_score[slot]),
+                    "latest_ts": float(self.last_ts[slot]),
+                    "projected": int(round(projected[slot])),
+                    "per_hour": float(slope[slot]),
+                    "samples": int(self.count[slot]),
+                }
+                for slot in slots
+                if fitted[slot]
+            }
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+ROW = Tuple[int, int, int, str]
+
+
+class Leaderboard(object):
+    """A ranking held as parallel arrays, best score first
+
+    Ranks, scores and profile_ids are int64 arrays and names are interned strings, so a full top 5000 board is a few
+    hundred kilobytes instead of a dict per player. Scores are kept in descending order which makes rank and score
+    lookups a binary search, and a second index sorted by profile_id does the same for player lookups.
+    """
+
+    def __init__(self, ranks: np.ndarray, scores: np.ndarray, profile_ids: np.ndarray, names: List[str]):
+        """Takes arrays already sorted best first, use from_rows or from_ranking to build one from unsorted data"""
+        self.ranks = ranks
+        self.scores = scores
+        self.profile_ids = profile_ids
+        self.names = names
+        # Ranks reported by pages fetched at different times can go backwards slightly, searches use a monotone copy
+        self.rank_index = np.maximum.accumulate(ranks) if len(ranks) else ranks
+        self.ascending_scores = scores[::-1]
+        self.id_order = np.argsort(profile_ids, kind="stable")
+        self.sorted_ids = profile_ids[self.id_order]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[ROW]) -> "Leaderboard":
+        """Builds a leaderboard from (rank, score, profile_id, name) rows in any order"""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        ranks, scores, profile_ids, names = zip(*rows)
+        ranks = np.array(ranks, dtype=np.int64)
+        scores = np.array(scores, dtype=np.int64)
+        order = np.lexsort((ranks, -scores))
+        return cls(
+            ranks[order],
+            scores[order],
+            np.array(profile_ids, dtype=np.int64)[order],
+            [sys.intern(names[i] or "") for i in order],
+        )
+
+    @classmethod
+    def from_ranking(cls, ranking_lists: Iterable[Sequence[dict]]) -> "Leaderboard":
+        """Builds a leaderboard from raw ranking pages, a player found on two pages keeps their later entry"""
+        players = {}
+        for ranking_list in ranking_lists:
+            for player in ranking_list:
+                players[player["friend_profile"]["profile_id"]] = player
+        return cls.from_rows(
+            (player["score_rank"], player["score_point"], profile_id, player["friend_profile"]["name"])
+            for profile_id, player in players.items()
+        )
+
+    @classmethod
+    def empty(cls) -> "Leaderboard":
+        empty = np.zeros(0, dtype=np.int64)
+        return cls(empty, empty, empty, [])
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __iter__(self) -> Iterator[ROW]:
+        return zip(self.ranks.tolist(), self.scores.tolist(), self.profile_ids.tolist(), self.names)
+
+    def __getitem__(self, positions: slice) -> "Leaderboard":
+        return Leaderboard(
+            self.ranks[positions], self.scores[positions], self.profile_ids[positions], self.names[positions]
+        )
+
+    def __contains__(self, profile_id: int) -> bool:
+        return self.position_of(profile_id) is not None
+
+    def position_of(self, profile_id: int) -> Optional[int]:
+        i = np.searchsorted(self.sorted_ids, profile_id)
+        if i < len(self.sorted_ids) and self.sorted_ids[i] == profile_id:
+            return int(self.id_order[i])
+        return None
+
+    def get(self, profile_id: int) -> Optional[ROW]:
+        position = self.position_of(profile_id)
+        if position is None:
+            return None
+        return (
+            int(self.ranks[position]),
+            int(self.scores[position]),
+            int(self.profile_ids[position]),
+            self.names[position],
+        )
+
+    def rank_of(self, profile_id: int) -> Optional[int]:
+        position = self.position_of(profile_id)
+        return None if position is None else int(self.ranks[position])
+
+    def rank_for_score(self, score: int) -> int:
+        """Rank a score would place at, one below everyone scoring more"""
+        return int(len(self) - np.searchsorted(self.ascending_scores, score, side="right")) + 1
+
+    def border(self, rank: int) -> Optional[int]:
+        """Score needed to be in the top rank, same as the get_top_N_*_border methods"""
+        if rank < 1 or rank > len(self):
+            return None
+        return int(self.scores[rank - 1])
+
+    def top(self, count: int) -> "Leaderboard":
+        return self[:count]
+
+    def slice_ranks(self, start: int, end: int) -> "Leaderboard":
+        """Players ranked from start to end inclusive"""
+        first = np.searchsorted(self.rank_index, start, side="left")
+        last = np.searchsorted(self.rank_index, end, side="right")
+        return self[first:last]
+
+    def percentile(self, score: int) -> float:
+        """Percentage of the board scoring at or below score"""
+        if not len(self):
+            return 0.0
+        return float(np.searchsorted(self.ascending_scores, score, side="right")) / len(self) * 100
+
+    def quantiles(self, quantiles: Sequence[float]) -> np.ndarray:
+        return np.quantile(self.scores, quantiles) if len(self) else np.zeros(len(quantiles))
+
+    def borders(self, ranks: Sequence[int]) -> np.ndarray:
+        """Borders for many ranks at once, 0 where the board is too short"""
+        positions = np.asarray(ranks, dtype=np.int64) - 1
+        valid = (positions >= 0) & (positions < len(self))
+        return np.where(valid, self.scores[np.where(valid, positions, 0)] if len(self) else 0, 0)
+
+    def border_gaps(self, ranks: Sequence[int]) -> np.ndarray:
+        """Score between each border and the next one down"""
+        borders = self.borders(ranks)
+        return borders[:-1] - borders[1:]
+
+    def ranks_for_scores(self, scores: Sequence[int]) -> np.ndarray:
+        return len(self) - np.searchsorted(self.ascending_scores, scores, side="right") + 1
+
+    def histogram(self, bins: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+        """Player counts per score bin and the bin edges"""
+        return np.histogram(self.scores, bins=bins)
+
+    def band_stats(self, bands: Sequence[Tuple[int, int]]) -> List[dict]:
+        """Player count and score range of each (start, end) rank band"""
+        stats = []
+        for start, end in bands:
+            scores = self.slice_ranks(start, end).scores
+            stats.append(
+                {
+                    "start": start,
+                    "end": end,
+                    "players": len(scores),
+                    "min": int(scores.min()) if len(scores) else None,
+                    "max": int(scores.max()) if len(scores) else None,
+                    "median": int(np.median(scores)) if len(scores) else None,
+                }
+            )
+        return stats
+
+    def format_lines(self) -> List[str]:
+        return [f"{rank}: {score:,d} - {name}({profile_id})" for rank, score, profile_id, name in self]
+
+
+@dataclass
+class LeaderboardDiff(object):
+    """Changes between two snapshots of a ranking
+
+    moves holds (profile_id, name, old_rank, new_rank, score_change) for every player whose rank changed.
+    """
+
+    entries: List[ROW]
+    exits: List[ROW]
+    moves: List[Tuple[int, str, int, int, int]]
+
+    def climbers(self, count: int = 10) -> List[Tuple[int, str, int, int, int]]:
+        climbers = [move for move in self.moves if move[3] < move[2]]
+        return sorted(climbers, key=lambda move: move[3] - move[2])[:count]
+
+    def fallers(self, count: int = 10) -> List[Tuple[int, str, int, int, int]]:
+        fallers = [move for move in self.moves if move[3] > move[2]]
+        return sorted(fallers, key=lambda move: move[2] - move[3])[:count]
+
+
+def diff_leaderboards(old: Leaderboard, new: Leaderboard) -> LeaderboardDiff:
+    """Joins two snapshots on profile_id, linear in the size of both"""
+    old_rows = {profile_id: (rank, score, name) for rank, score, profile_id, name in old}
+    entries = []
+    moves = []
+    for rank, score, profile_id, name in new:
+        old_row = old_rows.pop(profile_id, None)
+        if old_row is None:
+            entries.append((rank, score, profile_id, name))
+        elif old_row[0] != rank:
+            moves.append((profile_id, name, old_row[0], rank, score - old_row[1]))
+    exits = [(rank, score, profile_id, name) for profile_id, (rank, score, name) in old_rows.items()]
+    return LeaderboardDiff(entries, sorted(exits), moves)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+class ReactionPaginator(object):
+    """Flips a message through pages with reactions, rendering a page only when it's shown
+
+    Adding or removing a control reaction both count as a press, so nothing needs the manage messages permission to
+    take reactions back off and it works the same in DMs. Only the author of the command can flip pages.
+    """
+
+    FIRST = "\u23ee"
+    PREVIOUS = "\u25c0"
+    NEXT = "\u25b6"
+    LAST = "\u23ed"
+    CONTROLS = (FIRST, PREVIOUS, NEXT, LAST)
+
+    def __init__(self, client, render: Callable[[int], Awaitable[Any]], pages: int, timeout: float = 120):
+        """render(page) returns the embed of a 0 based page"""
+        self.client = client
+        self.render = render
+        self.pages = pages
+        self.timeout = timeout
+        self.page = 0
+
+    def turn(self, emoji: str) -> int:
+        return {
+            self.FIRST: 0,
+            self.PREVIOUS: max(self.page - 1, 0),
+            self.NEXT: min(self.page + 1, self.pages - 1),
+            self.LAST: self.pages - 1,
+        }[emoji]
+
+    @staticmethod
+    def emoji_name(reaction) -> str:
+        # Discord can hand back the emoji with a trailing variation selector
+        return str(reaction.emoji).rstrip("\ufe0f")
+
+    async def wait_for_press(self, message, author):
+        def check(reaction, user):
+            return (
+                reaction.message.id == message.id
+                and user.id == author.id
+                and self.emoji_name(reaction) in self.CONTROLS
+            )
+
+        waits = [
+            asyncio.ensure_future(self.client.wait_for(event, check=check))
+            for event in ("reaction_add", "reaction_remove")
+        ]
+        done, pending = await asyncio.wait(waits, timeout=self.timeout, return_when=asyncio.FIRST_COMPLETED)
+        for wait in pending:
+            wait.cancel()
+        if not done:
+            return None
+        reaction, _ = done.pop().result()
+        return self.emoji_name(reaction)
+
+    async def start(self, ctx):
+        message = await ctx.send(embed=await self.render(self.page))
+        if self.pages <= 1:
+            return message
+        for emoji in self.CONTROLS:
+            await message.add_reaction(emoji)
+        while True:
+            emoji = await self.wait_for_press(message, ctx.author)
+            if emoji is None:
+                break
+            page = self.turn(emoji)
+            if page != self.page:
+                self.page = page
+                await message.edit(embed=await self.render(page))
+        try:
+            await message.clear_reactions()
+        except Exception as e:
+            # Bots can't clear reactions in DMs or without manage messages
+            logger.debug(f"Could not clear pagination reactions: {e}")
+        return message
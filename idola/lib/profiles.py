@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import logging
+from typing import Iterable, Optional, Tuple
+
+import pylru
+
+from .store import IdolaStore
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+class ProfileDirectory(object):
+    """Name to profile_id lookups with a small in-memory LRU in front of the store
+
+    The store keeps every profile ever seen along with when it was last seen. warm() seeds the LRU with the most
+    recently seen profiles at startup, after that only lookups add names to it so bulk ranking crawls don't push out
+    the names people are actually asking for.
+    """
+
+    def __init__(self, store: IdolaStore, hot_size: int = 1000):
+        self.store = store
+        self.hot = pylru.lrucache(size=hot_size)
+        self.hot_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def warm(self) -> None:
+        for name, profile_id in reversed(self.store.get_recent_profiles(self.hot.size())):
+            self.hot[name] = profile_id
+
+    def get(self, name: str) -> Optional[int]:
+        if name in self.hot:
+            self.hot_hits += 1
+            return self.hot[name]
+
+        profile_id = self.store.get_profile_id(name)
+        if profile_id is None:
+            self.misses += 1
+            return None
+        self.store_hits += 1
+        self.hot[name] = profile_id
+        return profile_id
+
+    def update(self, name: str, profile_id: int) -> None:
+        self.hot[name] = int(profile_id)
+        self.store.upsert_profile(name, int(profile_id))
+
+    def update_many(self, profiles: Iterable[Tuple[str, int]]) -> None:
+        profiles = [(name, int(profile_id)) for name, profile_id in profiles]
+        for name, profile_id in profiles:
+            if name in self.hot:
+                self.hot[name] = profile_id
+        self.store.upsert_profiles(profiles)
+
+    def search(self, prefix: str, limit: int = 10) -> list:
+        return self.store.search_profiles(prefix, limit)
+
+    def __len__(self) -> int:
+        return self.store.count_profiles()
+
+    def stats(self) -> dict:
+        lookups = self.hot_hits + self.store_hits + self.misses
+        return {
+            "known_profiles": len(self),
+            "hot_profiles": len(self.hot),
+            "hot_hits": self.hot_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hot_hits + self.store_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+# How often a suspended job is asked for its interval again
+SUSPENDED_RECHECK = 60
+
+# (seconds left in the event, polling interval) phases ordered from the end of the event backwards
+EVENT_PHASES = (
+    (60 * 60, 60),
+    (6 * 60 * 60, 2 * 60),
+    (24 * 60 * 60, 5 * 60),
+)
+EVENT_PHASE_DEFAULT = 15 * 60
+# Keep polling a little after the end so the final borders are picked up
+EVENT_GRACE_PERIOD = 60 * 60
+EVENT_GRACE_INTERVAL = 10 * 60
+
+
+def event_interval(
+    seconds_left: float,
+    phases: Sequence[Tuple[float, float]] = EVENT_PHASES,
+    default: float = EVENT_PHASE_DEFAULT,
+) -> Optional[float]:
+    """Polling interval for an event ending in seconds_left, None once the event is over"""
+    if seconds_left < -EVENT_GRACE_PERIOD:
+        return None
+    if seconds_left < 0:
+        return EVENT_GRACE_INTERVAL
+    for phase_end, interval in phases:
+        if seconds_left < phase_end:
+            return interval
+    return default
+
+
+@dataclass
+class Job(object):
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: Union[float, Callable[[], Optional[float]]]
+    priority: int = 0
+    depends_on: Tuple[str, ...] = ()
+    jitter: float = 0
+    next_run: float = 0
+    runs: int = field(default=0, repr=False)
+    failures: int = field(default=0, repr=False)
+    fetches: int = field(default=0, repr=False)
+    fetch_time: float = field(default=0, repr=False)
+    total_time: float = field(default=0, repr=False)
+    last_time: float = field(default=0, repr=False)
+
+    def get_interval(self) -> Optional[float]:
+        """Seconds until the next run, None while the job is suspended"""
+        return self.interval() if callable(self.interval) else self.interval
+
+    def schedule_next(self, now: float) -> None:
+        interval = self.get_interval()
+        if interval is None:
+            interval = SUSPENDED_RECHECK
+        self.next_run = now + interval + random.uniform(0, self.jitter)
+
+
+class Scheduler(object):
+    """Runs background refresh jobs from a single loop
+
+    Every tick the due jobs run one after another, ordered by their dependencies and then by priority (lowest
+    first). Blocking upstream calls made through shared() are run off the event loop and deduplicated for the rest of
+    the tick, so jobs that need the same data only fetch it once.
+
+    A job's interval can be a callable, it is asked again after every run and a job is suspended while it returns
+    None.
+    """
+
+    def __init__(self, tick: float = 15):
+        self.tick = tick
+        self.jobs: Dict[str, Job] = {}
+        self.tick_cache: Dict[Hashable, asyncio.Future] = {}
+        self.current_job: Optional[Job] = None
+        # Jobs and commands both go through this one worker, the API chains a retrans_key through every request and
+        # the profile directory isn't thread safe, so upstream calls must never overlap
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scheduler")
+        self.task: Optional[asyncio.Task] = None
+
+    def add_job(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        interval: Union[float, Callable[[], Optional[float]]],
+        priority: int = 0,
+        depends_on: Tuple[str, ...] = (),
+        jitter: float = 0,
+        delay: float = 0,
+    ) -> Job:
+        job = Job(name, func, interval, priority=priority, depends_on=depends_on, jitter=jitter)
+        job.next_run = time.monotonic() + delay + random.uniform(0, jitter)
+        self.jobs[name] = job
+        return job
+
+    def trigger(self, name: str) -> None:
+        """Runs a job on the next tick"""
+        self.jobs[name].next_run = 0
+
+    def start(self) -> None:
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self.run())
+
+    def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.exception(e)
+            await asyncio.sleep(self.tick)
+
+    def plan(self, now: float) -> List[Job]:
+        """Due jobs in the order they should run"""
+        due = {name: job for name, job in self.jobs.items() if job.next_run <= now}
+        planned: List[Job] = []
+        visited = set()
+
+        def visit(job):
+            if job.name in visited:
+                return
+            visited.add(job.name)
+            for dependency in sorted(job.depends_on, key=lambda name: self.jobs[name].priority):
+                if dependency in due:
+                    visit(due[dependency])
+            planned.append(job)
+
+        for job in sorted(due.values(), key=lambda job: job.priority):
+            visit(job)
+        return planned
+
+    async def run_due(self) -> None:
+        now = time.monotonic()
+        self.tick_cache = {}
+        failed = set()
+        for job in self.plan(now):
+            if job.get_interval() is None:
+                job.schedule_next(now)
+                continue
+            if failed.intersection(job.depends_on):
+                logger.info(f"Skipping {job.name}, a job it depends on failed")
+                job.schedule_next(now)
+                continue
+            if not await self.run_job(job):
+                failed.add(job.name)
+        self.tick_cache = {}
+
+    async def run_job(self, job: Job) -> bool:
+        self.current_job = job
+        start = time.monotonic()
+        try:
+            await job.func()
+            return True
+        except Exception as e:
+            job.failures += 1
+            logger.exception(e)
+            return False
+        finally:
+            job.runs += 1
+            job.last_time = time.monotonic() - start
+            job.total_time += job.last_time
+            job.schedule_next(time.monotonic())
+            self.current_job = None
+
+    async def shared(self, key: Hashable, func: Callable[..., Any], *args: Any) -> Any:
+        """Runs a blocking func(*args) off the event loop once per tick and shares the result"""
+        if key not in self.tick_cache:
+            self.tick_cache[key] = asyncio.ensure_future(self._fetch(self.current_job, func, *args))
+        return await self.tick_cache[key]
+
+    async def call(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Runs a blocking func(*args) on the jobs' worker without sharing it, for commands that use the API"""
+        return await self._fetch(None, func, *args)
+
+    async def _fetch(self, job: Optional[Job], func: Callable[..., Any], *args: Any) -> Any:
+        start = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            if job is not None:
+                job.fetches += 1
+                job.fetch_time += time.monotonic() - start
+
+    def stats(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "name": job.name,
+                "runs": job.runs,
+                "failures": job.failures,
+                "fetches": job.fetches,
+                "fetch_time": job.fetch_time,
+                "last_time": job.last_time,
+                "average_time": job.total_time / job.runs if job.runs else 0,
+                "next_run": max(0, job.next_run - now),
+                "interval": job.get_interval(),
+            }
+            for job in sorted(self.jobs.values(), key=lambda job: job.priority)
+        ]
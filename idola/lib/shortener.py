@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import base64
+import hashlib
+import logging
+from typing import Optional
+from urllib.parse import urlparse
+
+from aiohttp import web
+
+from .store import IdolaStore
+from .util import shorten_url
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+
+class LinkShortener(object):
+    """Content-addressed short links served from a local redirect endpoint
+
+    Links are keyed by a hash of the full URL so the same build always maps to the same short link. When no
+    base_url is configured the bot has no public endpoint, so links are shortened with tinyurl instead and the
+    result is remembered against the same key.
+    """
+
+    KEY_LENGTH = 10
+
+    def __init__(self, store: IdolaStore, base_url: Optional[str] = None, tinyurl_timeout: float = 5):
+        self.store = store
+        self.base_url = base_url.rstrip("/") + "/" if base_url else None
+        self.tinyurl_timeout = tinyurl_timeout
+        self.runner = None
+
+    def get_key(self, url: str) -> str:
+        digest = base64.urlsafe_b64encode(hashlib.sha256(url.encode("utf-8")).digest()).decode("ascii")
+        # Grow the key on the off chance a prefix is already taken by a different URL
+        for length in range(self.KEY_LENGTH, len(digest)):
+            key = digest[:length]
+            short_link = self.store.get_short_link(key)
+            if short_link is None or short_link[0] == url:
+                return key
+        return digest
+
+    async def shorten(self, url: str) -> str:
+        key = self.get_key(url)
+        short_link = self.store.get_short_link(key)
+        if short_link is None:
+            self.store.add_short_link(key, url)
+        if self.base_url:
+            return self.base_url + key
+
+        if short_link is not None and short_link[1]:
+            return short_link[1]
+        try:
+            loop = asyncio.get_running_loop()
+            tinyurl = await asyncio.wait_for(
+                loop.run_in_executor(None, shorten_url, url, self.tinyurl_timeout),
+                timeout=self.tinyurl_timeout,
+            )
+        except Exception as e:
+            logger.error(f"Could not shorten link with tinyurl - {e}")
+            return url
+        self.store.set_short_link_tinyurl(key, tinyurl)
+        return tinyurl
+
+    async def redirect(self, request: web.Request) -> web.Response:
+        short_link = self.store.get_short_link(request.match_info["key"])
+        if short_link is None:
+            raise web.HTTPNotFound()
+        raise web.HTTPFound(short_link[0])
+
+    async def start_server(self, host: str, port: int) -> None:
+        if self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get(urlparse(self.base_url).path + "{key}", self.redirect)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        try:
+            await web.TCPSite(self.runner, host, port).start()
+        except OSError:
+            await self.runner.cleanup()
+            self.runner = None
+            raise
+        logger.info(f"Serving short links on {host}:{port} as {self.base_url}")
+
+    async def stop_server(self) -> None:
+        if self.runner is None:
+            return
+        await self.runner.cleanup()
+        self.runner = None
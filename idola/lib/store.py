@@ -0,0 +1,426 @@
+# -*- coding: utf-8 -*-
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .util import normalize_name
+
+logger = logging.getLogger(f"idola.{__name__}")
+
+# Each entry upgrades the schema by one version, tracked with PRAGMA user_version
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS profiles (
+        profile_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        last_seen REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS profiles_name ON profiles (name);
+    CREATE INDEX IF NOT EXISTS profiles_last_seen ON profiles (last_seen);
+    CREATE TABLE IF NOT EXISTS discord_profiles (
+        discord_id INTEGER PRIMARY KEY,
+        profile_id INTEGER NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE profiles ADD COLUMN name_key TEXT NOT NULL DEFAULT '';
+    UPDATE profiles SET name_key = normalize_name(name);
+    CREATE INDEX IF NOT EXISTS profiles_name_key ON profiles (name_key);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS short_links (
+        key TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        tinyurl TEXT,
+        created_at REAL NOT NULL
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS border_snapshots (
+        ranking_type TEXT NOT NULL,
+        event_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        ts REAL NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (ranking_type, event_id, rank, ts)
+    ) WITHOUT ROWID;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+        snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ranking_type TEXT NOT NULL,
+        event_id INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        next_offset INTEGER NOT NULL DEFAULT 0,
+        started_at REAL NOT NULL,
+        finished_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS leaderboard_snapshots_type ON leaderboard_snapshots (ranking_type, finished_at);
+    CREATE TABLE IF NOT EXISTS leaderboard_rows (
+        snapshot_id INTEGER NOT NULL,
+        profile_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (snapshot_id, profile_id)
+    ) WITHOUT ROWID;
+    """,
+    """
+    ALTER TABLE leaderboard_rows ADD COLUMN name TEXT;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_ranks (
+        profile_id INTEGER NOT NULL,
+        ranking_type TEXT NOT NULL,
+        ts REAL NOT NULL,
+        event_id INTEGER NOT NULL,
+        snapshot_id INTEGER NOT NULL,
+        rank INTEGER NOT NULL,
+        score INTEGER NOT NULL,
+        PRIMARY KEY (profile_id, ranking_type, ts)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS discord_profiles_profile_id ON discord_profiles (profile_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS alerts (
+        alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        discord_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        ranking_type TEXT NOT NULL,
+        rank INTEGER NOT NULL,
+        score INTEGER,
+        profile_id INTEGER,
+        created_at REAL NOT NULL
+    );
+    """,
+]
+
+# Sorts after every other code point so it can close off a prefix range on the name_key index
+MAX_CODE_POINT = chr(0x10FFFF)
+
+
+class IdolaStore(object):
+    def __init__(self, db_location: str = "idola.db"):
+        self.db_location = db_location
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_location, check_same_thread=False)
+        self.conn.create_function("normalize_name", 1, normalize_name, deterministic=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+        logger.info(f"Opened store {self.db_location}")
+
+    def migrate(self) -> None:
+        with self.lock:
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            for i, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+                logger.info(f"Migrating {self.db_location} to schema version {i}")
+                self.conn.executescript(f"BEGIN;\n{migration}\nPRAGMA user_version = {i};\nCOMMIT;")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.lock, self.conn:
+            yield self.conn
+
+    def execute(self, sql: str, parameters: Iterable = ()) -> list:
+        with self.lock:
+            return self.conn.execute(sql, tuple(parameters)).fetchall()
+
+    def checkpoint(self) -> None:
+        with self.lock:
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
+
+    def get_state(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        rows = self.execute("SELECT value FROM bot_state WHERE key = ?", (key,))
+        return rows[0][0] if rows else default
+
+    def set_state(self, key: str, value: Optional[str]) -> None:
+        with self.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, value))
+
+    def upsert_profiles(self, profiles: Iterable[Tuple[str, int]], last_seen: Optional[float] = None) -> None:
+        last_seen = last_seen or time.time()
+        self.upsert_profile_rows((name, profile_id, last_seen) for name, profile_id in profiles)
+
+    def upsert_profile_rows(self, rows: Iterable[Tuple[str, int, float]]) -> None:
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO profiles (profile_id, name, name_key, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(profile_id) DO UPDATE SET "
+                "name = excluded.name, name_key = excluded.name_key, last_seen = excluded.last_seen",
+                ((int(profile_id), name, normalize_name(name), last_seen) for name, profile_id, last_seen in rows),
+            )
+
+    def upsert_profile(self, name: str, profile_id: int) -> None:
+        self.upsert_profiles([(name, profile_id)])
+
+    def get_profile_id(self, name: str) -> Optional[int]:
+        rows = self.execute(
+            "SELECT profile_id FROM profiles WHERE name = ? ORDER BY last_seen DESC LIMIT 1",
+            (name,),
+        )
+        return rows[0][0] if rows else None
+
+    def search_profiles(self, prefix: str, limit: int = 10) -> list:
+        """Case-insensitive prefix search, exact matches first then the most recently seen"""
+        key = normalize_name(prefix)
+        if not key:
+            return []
+        return self.execute(
+            "SELECT name, profile_id FROM profiles WHERE name_key >= ? AND name_key < ? "
+            "ORDER BY name_key = ? DESC, last_seen DESC LIMIT ?",
+            (key, key + MAX_CODE_POINT, key, limit),
+        )
+
+    def get_recent_profiles(self, limit: int) -> list:
+        return self.execute(
+            "SELECT name, profile_id FROM profiles ORDER BY last_seen DESC LIMIT ?",
+            (limit,),
+        )
+
+    def count_profiles(self) -> int:
+        return self.execute("SELECT COUNT(*) FROM profiles")[0][0]
+
+    def set_discord_profile_id(self, discord_id: int, profile_id: int) -> None:
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO discord_profiles (discord_id, profile_id) VALUES (?, ?) "
+                "ON CONFLICT(discord_id) DO UPDATE SET profile_id = excluded.profile_id",
+                (int(discord_id), int(profile_id)),
+            )
+
+    def set_discord_profile_ids(self, discord_profile_ids: dict) -> None:
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO discord_profiles (discord_id, profile_id) VALUES (?, ?)",
+                ((int(discord_id), int(profile_id)) for discord_id, profile_id in discord_profile_ids.items()),
+            )
+
+    def get_discord_profile_id(self, discord_id: int) -> Optional[int]:
+        rows = self.execute(
+            "SELECT profile_id FROM discord_profiles WHERE discord_id = ?",
+            (int(discord_id),),
+        )
+        return rows[0][0] if rows else None
+
+    def count_discord_profiles(self) -> int:
+        return self.execute("SELECT COUNT(*) FROM discord_profiles")[0][0]
+
+    def get_short_link(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        rows = self.execute("SELECT url, tinyurl FROM short_links WHERE key = ?", (key,))
+        return rows[0] if rows else None
+
+    def add_short_link(self, key: str, url: str) -> None:
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO short_links (key, url, created_at) VALUES (?, ?, ?)",
+                (key, url, time.time()),
+            )
+
+    def set_short_link_tinyurl(self, key: str, tinyurl: str) -> None:
+        with self.transaction() as conn:
+            conn.execute("UPDATE short_links SET tinyurl = ? WHERE key = ?", (tinyurl, key))
+
+    def add_border_snapshots(self, rows: Iterable[Tuple[str, int, int, float, int]]) -> None:
+        """Stores (ranking_type, event_id, rank, ts, score) samples"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO border_snapshots (ranking_type, event_id, rank, ts, score) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (ranking_type, int(event_id), int(rank), ts, int(score))
+                    for ranking_type, event_id, rank, ts, score in rows
+                ),
+            )
+
+    def get_border_history(
+        self,
+        ranking_type: str,
+        event_id: int,
+        rank: int,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> List[Tuple[float, int]]:
+        """(ts, score) samples for a border between start and end, oldest first"""
+        return self.execute(
+            "SELECT ts, score FROM border_snapshots "
+            "WHERE ranking_type = ? AND event_id = ? AND rank = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (
+                ranking_type,
+                int(event_id),
+                int(rank),
+                start if start is not None else float("-inf"),
+                end if end is not None else float("inf"),
+            ),
+        )
+
+    def get_border_snapshots(self, ranking_type: str, event_id: int) -> List[Tuple[int, float, int]]:
+        """Every (rank, ts, score) sample recorded for an event"""
+        return self.execute(
+            "SELECT rank, ts, score FROM border_snapshots WHERE ranking_type = ? AND event_id = ?",
+            (ranking_type, int(event_id)),
+        )
+
+    def get_border_ranks(self, ranking_type: str, event_id: int) -> List[int]:
+        rows = self.execute(
+            "SELECT DISTINCT rank FROM border_snapshots WHERE ranking_type = ? AND event_id = ? ORDER BY rank",
+            (ranking_type, int(event_id)),
+        )
+        return [rank for rank, in rows]
+
+    def get_latest_border_event_id(self, ranking_type: str) -> Optional[int]:
+        rows = self.execute("SELECT MAX(event_id) FROM border_snapshots WHERE ranking_type = ?", (ranking_type,))
+        return rows[0][0] if rows else None
+
+    def create_leaderboard_snapshot(self, ranking_type: str, event_id: int, size: int) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO leaderboard_snapshots (ranking_type, event_id, size, started_at) VALUES (?, ?, ?, ?)",
+                (ranking_type, int(event_id), int(size), time.time()),
+            )
+            return cursor.lastrowid
+
+    def get_unfinished_leaderboard_snapshots(self) -> List[Tuple[int, str, int, int, int]]:
+        """(snapshot_id, ranking_type, event_id, size, next_offset) of crawls still in progress"""
+        return self.execute(
+            "SELECT snapshot_id, ranking_type, event_id, size, next_offset FROM leaderboard_snapshots "
+            "WHERE finished_at IS NULL ORDER BY snapshot_id"
+        )
+
+    def add_leaderboard_page(
+        self, snapshot_id: int, rows: Iterable[Tuple[int, int, int, Optional[str]]], next_offset: int
+    ) -> None:
+        """Stores (profile_id, rank, score, name) rows and moves the crawl checkpoint forward in one transaction
+
+        A player that moved between pages shows up twice, the later page wins.
+        """
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO leaderboard_rows (snapshot_id, profile_id, rank, score, name) "
+                "VALUES (?, ?, ?, ?, ?)",
+                ((snapshot_id, int(profile_id), int(rank), int(score), name) for profile_id, rank, score, name in rows),
+            )
+            conn.execute(
+                "UPDATE leaderboard_snapshots SET next_offset = ? WHERE snapshot_id = ?",
+                (next_offset, snapshot_id),
+            )
+
+    def finish_leaderboard_snapshot(self, snapshot_id: int) -> None:
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE leaderboard_snapshots SET finished_at = ? WHERE snapshot_id = ?",
+                (time.time(), snapshot_id),
+            )
+
+    def delete_leaderboard_snapshots(self, snapshot_ids: Iterable[int]) -> None:
+        snapshot_ids = [(snapshot_id,) for snapshot_id in snapshot_ids]
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM leaderboard_rows WHERE snapshot_id = ?", snapshot_ids)
+            conn.executemany("DELETE FROM leaderboard_snapshots WHERE snapshot_id = ?", snapshot_ids)
+
+    def prune_leaderboard_snapshots(self, ranking_type: str, keep: int) -> None:
+        """Deletes all but the newest keep finished snapshots of a ranking"""
+        rows = self.execute(
+            "SELECT snapshot_id FROM leaderboard_snapshots WHERE ranking_type = ? AND finished_at IS NOT NULL "
+            "ORDER BY finished_at DESC LIMIT -1 OFFSET ?",
+            (ranking_type, keep),
+        )
+        self.delete_leaderboard_snapshots(snapshot_id for snapshot_id, in rows)
+
+    def get_leaderboard_snapshot(self, snapshot_id: int) -> Optional[Tuple[int, str, int, float]]:
+        """(snapshot_id, ranking_type, event_id, finished_at) of a finished snapshot"""
+        rows = self.execute(
+            "SELECT snapshot_id, ranking_type, event_id, finished_at FROM leaderboard_snapshots "
+            "WHERE snapshot_id = ? AND finished_at IS NOT NULL",
+            (int(snapshot_id),),
+        )
+        return rows[0] if rows else None
+
+    def get_leaderboard_snapshots(self, ranking_type: str, limit: int = 1) -> List[Tuple[int, int, float]]:
+        """(snapshot_id, event_id, finished_at) of the newest finished snapshots of a ranking"""
+        return self.execute(
+            "SELECT snapshot_id, event_id, finished_at FROM leaderboard_snapshots "
+            "WHERE ranking_type = ? AND finished_at IS NOT NULL ORDER BY finished_at DESC LIMIT ?",
+            (ranking_type, limit),
+        )
+
+    def get_final_leaderboard_snapshots(self, ranking_type: str) -> List[Tuple[int, int, float]]:
+        """(snapshot_id, event_id, finished_at) of the newest finished snapshot of each event of a ranking"""
+        return self.execute(
+            "SELECT snapshot_id, event_id, MAX(finished_at) FROM leaderboard_snapshots "
+            "WHERE ranking_type = ? AND finished_at IS NOT NULL GROUP BY event_id ORDER BY event_id",
+            (ranking_type,),
+        )
+
+    def get_leaderboard_rows(self, snapshot_id: int) -> List[Tuple[int, int, int, Optional[str]]]:
+        """(rank, score, profile_id, name) rows of a snapshot, best first"""
+        return self.execute(
+            "SELECT r.rank, r.score, r.profile_id, COALESCE(r.name, p.name) FROM leaderboard_rows r "
+            "LEFT JOIN profiles p ON p.profile_id = r.profile_id "
+            "WHERE r.snapshot_id = ? ORDER BY r.score DESC, r.rank",
+            (snapshot_id,),
+        )
+
+    def record_user_ranks(self, snapshot_id: int, profile_id: Optional[int] = None) -> int:
+        """Copies the snapshot rows of registered profiles, or just profile_id, into user_ranks
+
+        Only looks up the registered profiles in the snapshot rather than scanning it. Returns the rows recorded.
+        """
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT OR REPLACE INTO user_ranks (profile_id, ranking_type, ts, event_id, snapshot_id, rank, score) "
+                "SELECT r.profile_id, s.ranking_type, s.finished_at, s.event_id, s.snapshot_id, r.rank, r.score "
+                "FROM leaderboard_snapshots s "
+                "JOIN (SELECT DISTINCT profile_id FROM discord_profiles) d "
+                "JOIN leaderboard_rows r ON r.snapshot_id = s.snapshot_id AND r.profile_id = d.profile_id "
+                "WHERE s.snapshot_id = ? AND s.finished_at IS NOT NULL AND (? IS NULL OR d.profile_id = ?)",
+                (int(snapshot_id), profile_id, profile_id),
+            )
+            return cursor.rowcount
+
+    def get_user_ranks(self, profile_id: int, ranking_type: str, event_id: int) -> List[Tuple[float, int, int, int]]:
+        """(ts, snapshot_id, rank, score) of a profile over an event, oldest first"""
+        return self.execute(
+            "SELECT ts, snapshot_id, rank, score FROM user_ranks "
+            "WHERE profile_id = ? AND ranking_type = ? AND event_id = ? ORDER BY ts",
+            (int(profile_id), ranking_type, int(event_id)),
+        )
+
+    def add_alert(
+        self,
+        discord_id: int,
+        kind: str,
+        ranking_type: str,
+        rank: int,
+        score: Optional[int] = None,
+        profile_id: Optional[int] = None,
+    ) -> int:
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO alerts (discord_id, kind, ranking_type, rank, score, profile_id, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (int(discord_id), kind, ranking_type, int(rank), score, profile_id, time.time()),
+            )
+            return cursor.lastrowid
+
+    def get_alerts(self) -> List[Tuple[int, int, str, str, int, Optional[int], Optional[int]]]:
+        """(alert_id, discord_id, kind, ranking_type, rank, score, profile_id) of every alert"""
+        return self.execute(
+            "SELECT alert_id, discord_id, kind, ranking_type, rank, score, profile_id FROM alerts ORDER BY alert_id"
+        )
+
+    def delete_alerts(self, alert_ids: Iterable[int]) -> None:
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM alerts WHERE alert_id = ?", ((int(alert_id),) for alert_id in alert_ids))
@@ -1,7 +1,15 @@
+import asyncio
 import datetime
+import hashlib
 import logging
+import os
 import pickle
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
 
+import pylru
 import pytz
 import twitter
 from google_trans_new import google_translator
@@ -9,7 +17,82 @@ from google_trans_new import google_translator
 logger = logging.getLogger(f"idola.{__name__}")
 
 
+class TweetLog(object):
+    """Append-only log of seen tweet IDs packed as little-endian uint64s
+
+    Tweet IDs increase over time so only the tail of the log is needed to know what has been seen, anything older
+    than the tail is treated as seen and the newest ID is used as the since_id for timeline requests.
+    """
+
+    RECORD = struct.Struct("<Q")
+
+    def __init__(self, filepath: str, tail_size: int = 1000, max_size: int = 100000):
+        self.filepath = filepath
+        self.tail_size = tail_size
+        self.max_size = max_size
+        self.recent = {}
+        self.floor_id = 0
+        self.since_id = 0
+        self.size = 0
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.filepath, "r+b") as f:
+                file_size = f.seek(0, os.SEEK_END)
+                self.size = file_size // self.RECORD.size
+                if file_size % self.RECORD.size:
+                    logger.error(f"Dropping partially written record at the end of {self.filepath}")
+                    f.truncate(self.size * self.RECORD.size)
+                tail = self._read_tail(f)
+        except FileNotFoundError:
+            return
+        self.recent = dict.fromkeys(tail)
+        self.floor_id = min(tail, default=0)
+        self.since_id = max(tail, default=0)
+        logger.info(f"Loaded {len(tail)} of {self.size} seen tweets from {self.filepath}")
+
+    def _read_tail(self, f) -> list:
+        start = max(0, self.size - self.tail_size)
+        f.seek(start * self.RECORD.size)
+        data = f.read((self.size - start) * self.RECORD.size)
+        return [tweet_id for (tweet_id,) in self.RECORD.iter_unpack(data)]
+
+    def __contains__(self, tweet_id: int) -> bool:
+        return tweet_id in self.recent or tweet_id <= self.floor_id
+
+    def append(self, tweet_ids: Iterable[int]) -> None:
+        tweet_ids = [int(tweet_id) for tweet_id in tweet_ids]
+        if not tweet_ids:
+            return
+        with open(self.filepath, "ab") as f:
+            f.write(b"".join(self.RECORD.pack(tweet_id) for tweet_id in tweet_ids))
+        self.size += len(tweet_ids)
+        self.since_id = max(self.since_id, *tweet_ids)
+        for tweet_id in tweet_ids:
+            self.recent[tweet_id] = None
+        while len(self.recent) > self.tail_size:
+            evicted_id = next(iter(self.recent))
+            del self.recent[evicted_id]
+            self.floor_id = max(self.floor_id, evicted_id)
+        if self.size > self.max_size:
+            self.compact()
+
+    def compact(self) -> None:
+        """Rewrites the log keeping only the tail"""
+        with open(self.filepath, "rb") as f:
+            tail = self._read_tail(f)
+        tmp_filepath = self.filepath + ".tmp"
+        with open(tmp_filepath, "wb") as f:
+            f.write(b"".join(self.RECORD.pack(tweet_id) for tweet_id in tail))
+        os.replace(tmp_filepath, self.filepath)
+        logger.info(f"Compacted {self.filepath} from {self.size} to {len(tail)} tweets")
+        self.size = len(tail)
+
+
 class TwitterAPI:
+    TRANSLATE_TIMEOUT = 10
+
     def __init__(
         self,
         consumer_key: str,
@@ -18,9 +101,14 @@ class TwitterAPI:
         access_token_secret: str,
     ):
         self.api = None
-        self.existing_tweets = set()
+        self.tweet_log = None
+        self.translator = google_translator(timeout=self.TRANSLATE_TIMEOUT)
+        self.translations = pylru.lrucache(size=256)
+        self.translations_lock = threading.Lock()
+        self.translate_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="translate")
         self.bot_start_ts = datetime.datetime.utcnow().replace(tzinfo=pytz.utc)
-        self.db_location = "tweet_ids.p"
+        self.db_location = "tweet_ids.log"
+        self.legacy_db_location = "tweet_ids.p"
         self.screen_name = "sega_idola"
         self.access_token_key = access_token_key
         self.access_token_secret = access_token_secret
@@ -31,24 +119,27 @@ class TwitterAPI:
         self.start()
 
     def load_existing_tweets(self) -> bool:
-        if not self.db_location:
-            return
+        logger.info(f"Loading existing tweets from {self.db_location}")
+        self.tweet_log = TweetLog(self.db_location)
+        self.import_legacy_tweets()
+        return True
 
+    def import_legacy_tweets(self) -> bool:
         try:
-            logger.info(f"Loading existing tweets from {self.db_location}")
-            with open(self.db_location, "rb") as f:
-                self.existing_tweets = pickle.load(f)
-        except FileNotFoundError as e:
-            logger.error(f"Error: Could not load existing tweets: {e}")
+            with open(self.legacy_db_location, "rb") as f:
+                existing_tweets = pickle.load(f)
+        except FileNotFoundError:
             return False
         except EOFError as e:
             logger.error(f"Error: Could not unpickle file: {e}")
-            self.existing_tweets = set()
+            return False
+        self.tweet_log.append(tweet_id for tweet_id in sorted(existing_tweets) if tweet_id not in self.tweet_log)
+        os.replace(self.legacy_db_location, self.legacy_db_location + ".migrated")
+        logger.info(f"Imported {len(existing_tweets)} tweets from {self.legacy_db_location}")
         return True
 
-    def save_existing_tweets(self) -> None:
-        with open(self.db_location, "wb") as f:
-            pickle.dump(self.existing_tweets, f)
+    def save_existing_tweets(self, tweet_ids: Iterable[int]) -> None:
+        self.tweet_log.append(tweet_ids)
 
     def start(self) -> None:
         self.api = twitter.Api(
@@ -68,14 +159,14 @@ class TwitterAPI:
             exclude_replies=True,
             include_rts=True,
             count=5,
+            since_id=self.tweet_log.since_id or None,
         )
         for tweet in tweets:
-            if tweet.id in self.existing_tweets:
+            if tweet.id in self.tweet_log:
                 continue
             unseen_tweets.insert(0, tweet)
-            self.existing_tweets.add(tweet.id)
         if unseen_tweets:
-            self.save_existing_tweets()
+            self.save_existing_tweets(tweet.id for tweet in unseen_tweets)
         return unseen_tweets
 
     def get_test_tweet(self):
@@ -89,11 +180,33 @@ class TwitterAPI:
         return tweets[0] if len(tweets) != 1 else None
 
     def translate(self, message):
+        key = hashlib.sha1(message.encode("utf-8")).hexdigest()
+        with self.translations_lock:
+            if key in self.translations:
+                return self.translations[key]
         try:
-            translator = google_translator()
-            message = message.replace("イドラ", "IDOLA")
-            translated_text = translator.translate(message, lang_src="ja", lang_tgt="en")
+            translated_text = self.translator.translate(
+                message.replace("イドラ", "IDOLA"), lang_src="ja", lang_tgt="en"
+            )
+            with self.translations_lock:
+                self.translations[key] = translated_text
             return translated_text
         except Exception as e:
             logger.exception(e)
         return message
+
+    async def translate_many(self, messages: List[str]) -> List[str]:
+        """Translates messages concurrently off the event loop, falling back to the original text"""
+        loop = asyncio.get_running_loop()
+
+        async def _translate(message):
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self.translate_executor, self.translate, message),
+                    timeout=self.TRANSLATE_TIMEOUT,
+                )
+            except asyncio.TimeoutError:
+                logger.error(f"Timed out translating: {message[:50]}")
+                return message
+
+        return await asyncio.gather(*(_translate(message) for message in messages))
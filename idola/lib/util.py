@@ -1,13 +1,77 @@
 import contextlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Hashable, Sequence
 from urllib.parse import urlencode
 from urllib.request import urlopen
 
 
-def shorten_url(url: str) -> str:
+def shorten_url(url: str, timeout: float = 10) -> str:
     request_url = "http://tinyurl.com/api-create.php?" + urlencode({"url": url})
-    with contextlib.closing(urlopen(request_url)) as response:
+    with contextlib.closing(urlopen(request_url, timeout=timeout)) as response:
         return response.read().decode("utf-8")
 
 
-def base_round(x: int, base: int = 1) -> int:
-    return base * round(int(x) / base)
+def normalize_name(name: str) -> str:
+    return unicodedata.normalize("NFKC", name).casefold().strip()
+
+
+SPARK_BLOCKS = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+
+
+def sparkline(values: Sequence[float], width: int = 30) -> str:
+    """Text trend of values, squeezed into at most width characters by keeping the last value of each bucket"""
+    if not values:
+        return ""
+    if len(values) > width:
+        values = [values[(i + 1) * len(values) // width - 1] for i in range(width)]
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_BLOCKS[0] * len(values)
+    scale = (len(SPARK_BLOCKS) - 1) / (high - low)
+    return "".join(SPARK_BLOCKS[round((value - low) * scale)] for value in values)
+
+
+class TTLCache(object):
+    """Bounded mapping whose entries expire ttl seconds after they were set"""
+
+    def __init__(self, ttl: float, size: int = 1024):
+        self.ttl = ttl
+        self.size = size
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return default
+            return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, self) is not self
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self.lock:
+            entry = self.entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
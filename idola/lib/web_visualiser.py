@@ -1,11 +1,8 @@
 import json
 import logging
-from copy import deepcopy
 from itertools import chain
 from urllib.parse import quote
 
-from .util import shorten_url
-
 logger = logging.getLogger(f"idola.{__name__}")
 
 
@@ -61,108 +58,97 @@ base_data = {
 }
 
 
-class PartyStats(object):
-    @classmethod
-    def _import_party_info(cls, party_info):
-        data = deepcopy(base_data)
-        cls._set_main_party(data, party_info)
-        cls._set_character(data, party_info)
-        cls._set_character_lb(data, party_info)
-        cls._set_character_d(data, party_info)
-        cls._set_character_db(data, party_info)
-        cls._set_weapon_symbols(data, party_info)
-        cls._set_soul_symbols(data, party_info)
-        cls._set_idomag(data, party_info)
-        return data
+# Fields that change per party, everything else in base_data is constant and encoded once
+PARTY_FIELDS = ("Party", "CharacterID", "CharacterLB", "CharacterD", "CharacterDB", "WeaponID", "SoulID", "IdoMagID")
+QUOTE_SAFE = "~@#$&()*!+=:;,.?/'"
 
-    @classmethod
-    def _set_main_party(cls, data, party_info):
-        side_priority = party_info["side_priority"]
-        data["Party"] = f"{side_priority:02d}"
 
-    @classmethod
-    def _set_character(cls, data, party_info):
-        law_characters = [str(character["character"]["char_id"]) for character in party_info["law"]]
-        chaos_characters = [str(character["character"]["char_id"]) for character in party_info["chaos"]]
-        character_ids_encoded = []
-        for character in chain(law_characters, chaos_characters):
-            character_ids_encoded.append(character[:-2] + " " + character[-2:])
-        data["CharacterID"] = character_ids_encoded
+def _compile_template(template, fields):
+    """Splits the quoted JSON of template around fields so only their values need encoding per party"""
+    data = dict(template)
+    for i, field in enumerate(fields):
+        data[field] = f"@@{i}@@"
+    text = json.dumps(data, separators=(",", ":"))
+    chunks = []
+    for i in range(len(fields)):
+        chunk, text = text.split(f'"@@{i}@@"')
+        chunks.append(quote(chunk, safe=QUOTE_SAFE))
+    chunks.append(quote(text, safe=QUOTE_SAFE))
+    return chunks
 
-    @classmethod
-    def _set_character_lb(cls, data, party_info):
-        law_characters = [str(character["character"]["potential"]) for character in party_info["law"]]
-        chaos_characters = [str(character["character"]["potential"]) for character in party_info["chaos"]]
-        lb_encoded = []
-        for character in chain(law_characters, chaos_characters):
-            lb_encoded.append(character)
-        data["CharacterLB"] = lb_encoded
 
-    @classmethod
-    def _set_character_d(cls, data, party_info):
-        law_characters = [character["destiny_bonus_status"] for character in party_info["law"]]
-        chaos_characters = [character["destiny_bonus_status"] for character in party_info["chaos"]]
-        d_encoded = []
-        for db_status in chain(law_characters, chaos_characters):
-            d_encoded.append(1 if db_status >= 1 else 0.5)
-        data["CharacterD"] = d_encoded
+def _encode_ids(ids):
+    # Quoted form of a JSON list of "<id> <suffix>" strings
+    return "%5B%22" + "%22,%22".join(f"{i[:-2]}%20{i[-2:]}" for i in ids) + "%22%5D"
 
-    @classmethod
-    def _set_character_db(cls, data, party_info):
-        law_characters = [str(character["destiny_bonus_level"]) for character in party_info["law"]]
-        chaos_characters = [str(character["destiny_bonus_level"]) for character in party_info["chaos"]]
-        db_encoded = []
-        for character in chain(law_characters, chaos_characters):
-            db_encoded.append(character)
-        data["CharacterDB"] = db_encoded
+
+def _encode_strings(values):
+    return "%5B%22" + "%22,%22".join(values) + "%22%5D"
+
+
+class PartyStats(object):
+    template_chunks = _compile_template(base_data, PARTY_FIELDS)
 
     @classmethod
-    def _set_weapon_symbols(cls, data, party_info):
-        law_weapon_symbols = [str(character["weapon_symbol"]["symbol_id"]) for character in party_info["law"]]
-        chaos_weapon_symbols = [str(character["weapon_symbol"]["symbol_id"]) for character in party_info["chaos"]]
-        weapon_symbols = [character for character in chain(law_weapon_symbols, chaos_weapon_symbols)]
-        data["WeaponID"] = weapon_symbols
+    def _read_party_info(cls, party_info):
+        """Collects every per-character field in one pass over law then chaos"""
+        char_ids, lbs, ds, dbs, weapon_ids, soul_ids = [], [], [], [], [], []
+        for character in chain(party_info["law"], party_info["chaos"]):
+            char_ids.append(str(character["character"]["char_id"]))
+            lbs.append(str(character["character"]["potential"]))
+            ds.append(1 if character["destiny_bonus_status"] >= 1 else 0.5)
+            dbs.append(str(character["destiny_bonus_level"]))
+            weapon_ids.append(str(character["weapon_symbol"]["symbol_id"]))
+            soul_ids.append(str(character["soul_symbol"]["symbol_id"]))
+        idomag_ids = [
+            str(party_info["law_idomag"]["idomag_type_id"]),
+            str(party_info["chaos_idomag"]["idomag_type_id"]),
+        ]
+        return f"{party_info['side_priority']:02d}", char_ids, lbs, ds, dbs, weapon_ids, soul_ids, idomag_ids
 
     @classmethod
-    def _set_soul_symbols(cls, data, party_info):
-        law_soul_symbols = [str(character["soul_symbol"]["symbol_id"]) for character in party_info["law"]]
-        chaos_soul_symbols = [str(character["soul_symbol"]["symbol_id"]) for character in party_info["chaos"]]
-        soul_symbols = [character for character in chain(law_soul_symbols, chaos_soul_symbols)]
-        data["SoulID"] = soul_symbols
+    def _import_party_info(cls, party_info):
+        party, char_ids, lbs, ds, dbs, weapon_ids, soul_ids, idomag_ids = cls._read_party_info(party_info)
+        data = dict(base_data)
+        data["Party"] = party
+        data["CharacterID"] = [i[:-2] + " " + i[-2:] for i in char_ids]
+        data["CharacterLB"] = lbs
+        data["CharacterD"] = ds
+        data["CharacterDB"] = dbs
+        data["WeaponID"] = weapon_ids
+        data["SoulID"] = soul_ids
+        data["IdoMagID"] = [i[:-2] + " " + i[-2:] for i in idomag_ids]
+        return data
 
     @classmethod
-    def _set_idomag(cls, data, party_info):
-        law_idomag = str(party_info["law_idomag"]["idomag_type_id"])
-        chaos_idomag = str(party_info["chaos_idomag"]["idomag_type_id"])
-        encoded_idomag = []
-        for character in chain([law_idomag, chaos_idomag]):
-            encoded_idomag.append(character[:-2] + " " + character[-2:])
-        data["IdoMagID"] = encoded_idomag
+    def _encode_party_info(cls, party_info):
+        """URL quoted JSON of _import_party_info, built straight from the compiled template"""
+        party, char_ids, lbs, ds, dbs, weapon_ids, soul_ids, idomag_ids = cls._read_party_info(party_info)
+        values = (
+            "%22" + party + "%22",
+            _encode_ids(char_ids),
+            _encode_strings(lbs),
+            "%5B" + ",".join(map(str, ds)) + "%5D",
+            _encode_strings(dbs),
+            _encode_strings(weapon_ids),
+            _encode_strings(soul_ids),
+            _encode_ids(idomag_ids),
+        )
+        chunks = cls.template_chunks
+        return "".join(chain.from_iterable(zip(chunks, values))) + chunks[-1]
 
 
 class AfuureusIdolaStatusTool(PartyStats):
     url = "https://afuureus.github.io/"
 
     @classmethod
-    def generate_shareable_link(cls, party_info):
-        data = cls._import_party_info(party_info)
-        link = (
-            cls.url
-            + "?"
-            + "build="
-            + quote(json.dumps(data, separators=(",", ":")), safe="~@#$&()*!+=:;,.?/'")
-            + "&format=nnstjp"
-        )
-        shortened_link = shorten_url(link)
-        return shortened_link
+    def generate_link(cls, party_info):
+        return cls.url + "?build=" + cls._encode_party_info(party_info) + "&format=nnstjp"
 
 
 class NNSTJPWebVisualiser(PartyStats):
     url = "https://kinomyu.github.io/NNSTJP.github.io/Idola/index.html"
 
     @classmethod
-    def generate_shareable_link(cls, party_info):
-        data = cls._import_party_info(party_info)
-        link = cls.url + "?" + quote(json.dumps(data, separators=(",", ":")), safe="~@#$&()*!+=:;,.?/'")
-        shortened_link = shorten_url(link)
-        return shortened_link
+    def generate_link(cls, party_info):
+        return cls.url + "?" + cls._encode_party_info(party_info)